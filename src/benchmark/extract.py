@@ -0,0 +1,59 @@
+import argparse
+import os
+import requests
+import time
+import trafilatura
+from bs4 import BeautifulSoup as bs
+from coldata.crawler.utils import extract_info
+
+pages = {
+    'UCI': 'https://archive.ics.uci.edu/dataset/53/iris',
+    'AWS': 'https://registry.opendata.aws/noaa-gfs-bdp-pds/',
+    'PapersWithCode': 'https://paperswithcode.com/dataset/cityscapes',
+}
+
+
+def extract_soup(html, output_format):
+    # Previous path: a full html.parser soup, re-serialized and parsed again by trafilatura
+    soup = bs(html, 'html.parser')
+    return trafilatura.extract(str(soup), output_format=output_format)
+
+
+def measure(fn, html, output_format, num_repeats):
+    fn(html, output_format)
+    start = time.perf_counter()
+    for _ in range(num_repeats):
+        fn(html, output_format)
+    return (time.perf_counter() - start) / num_repeats * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-page extraction time before and after the single-parse path')
+    parser.add_argument('--num_repeats', type=int, default=20)
+    parser.add_argument('--output_format', default='markdown')
+    parser.add_argument('--files', nargs='*', default=[], help='Saved html pages to use instead of the sample urls')
+    args = parser.parse_args()
+
+    print(f"{'Page':<16}{'KB':>8}{'soup (ms)':>12}{'direct (ms)':>12}{'speedup':>10}")
+    if args.files:
+        samples = [(os.path.basename(path)[:15], path) for path in args.files]
+    else:
+        samples = list(pages.items())
+    for name, source in samples:
+        try:
+            if args.files:
+                with open(source, 'r', encoding='utf-8') as file:
+                    html = file.read()
+            else:
+                html = requests.get(source, timeout=30).text
+        except Exception as e:
+            print(f'{name:<16}failed to load {source}: {e}')
+            continue
+        before = measure(extract_soup, html, args.output_format, args.num_repeats)
+        after = measure(extract_info, html, args.output_format, args.num_repeats)
+        print(f'{name:<16}{len(html) / 1024:>8.0f}{before:>12.1f}{after:>12.1f}{before / after:>9.1f}x')
+    return
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+import argparse
+import os
+import subprocess
+import sys
+
+# Each statement runs in a fresh interpreter, as a scheduler.py-spawned main.py or demo.py would
+statements = {
+    'coldata': 'import coldata',
+    'mongodb': 'import coldata; coldata.mongodb.MongoDB',
+    'crawler': 'import coldata; coldata.crawler.run_crawlers',
+    'crawler.UCI': 'import coldata; coldata.crawler.UCI',
+    'vdb': 'import coldata; coldata.vdb.VDB',
+}
+heavy_modules = ['torch', 'transformers', 'langchain', 'pymilvus', 'selenium', 'kaggle', 'huggingface_hub',
+                 'trafilatura', 'pandas']
+
+
+def measure(statement):
+    # Wall time of the statement and the heavy modules it pulled in
+    code = (f'import sys, time\n'
+            f'start = time.perf_counter()\n'
+            f'{statement}\n'
+            f'print(time.perf_counter() - start)\n'
+            f'print(",".join(m for m in {heavy_modules!r} if m in sys.modules))\n')
+    src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=src_dir)
+    if result.returncode != 0:
+        return None, result.stderr.strip().splitlines()[-1]
+    lines = result.stdout.splitlines()
+    return float(lines[0]), lines[1] if len(lines) > 1 else ''
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import time of the coldata entry points')
+    parser.add_argument('--num_repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'Import':<14}{'Best (ms)':>12}  Heavy modules loaded")
+    for name, statement in statements.items():
+        times = []
+        for _ in range(args.num_repeats):
+            seconds, modules = measure(statement)
+            if seconds is None:
+                break
+            times.append(seconds)
+        if not times:
+            print(f'{name:<14}{"-":>12}  failed: {modules}')
+            continue
+        print(f'{name:<14}{min(times) * 1000:>12.0f}  {modules or "-"}')
+    return
+
+
+if __name__ == '__main__':
+    main()
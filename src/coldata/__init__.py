@@ -1 +1,14 @@
-from . import crawler, mongodb, vdb
+import importlib
+
+# Subpackages are imported on first access, so a crawler-only run never loads the embedding stack and vice versa
+_subpackages = ['crawler', 'mongodb', 'vdb']
+
+
+def __getattr__(name):
+    if name in _subpackages:
+        return importlib.import_module(f'.{name}', __name__)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(list(globals()) + _subpackages)
@@ -1,9 +1,28 @@
-from .crawler import *
-from .kaggle import *
-from .uci import *
-from .aws import *
-from .pwc import *
-from .opendatalab import *
-from .ieeedp import *
-from .huggingface import *
-from .bdsp import *
\ No newline at end of file
+import importlib
+
+# Each source imports its own client (selenium, kaggle, huggingface_hub...) only when it is first used
+_modules = {
+    'Crawler': 'crawler',
+    'RETRY_STATUS': 'crawler',
+    'Kaggle': 'kaggle',
+    'UCI': 'uci',
+    'AWS': 'aws',
+    'PapersWithCode': 'pwc',
+    'OpenDataLab': 'opendatalab',
+    'IEEEDataPort': 'ieeedp',
+    'HuggingFace': 'huggingface',
+    'BrainDataSciencePlatform': 'bdsp',
+    'run_crawler': 'orchestrator',
+    'run_crawlers': 'orchestrator',
+    'print_summary': 'orchestrator',
+}
+
+
+def __getattr__(name):
+    if name in _modules:
+        return getattr(importlib.import_module(f'.{_modules[name]}', __name__), name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_modules))
@@ -0,0 +1,46 @@
+import json
+import os
+import zstandard
+from datetime import datetime, timezone
+from ..utils import makedir_exist_ok
+
+
+class Archive:
+    """
+    Raw pages compressed with zstd, one file per url at <root>/<index[:2]>/<index>.zst, where index is the url hash.
+    A page fetched again replaces the previous one.
+    """
+
+    def __init__(self, root, level=3):
+        self.root = root
+        self.level = level
+
+    def make_path(self, index):
+        return os.path.join(self.root, index[:2], f'{index}.zst')
+
+    def put(self, index, url, html):
+        record = {'url': url, 'fetched_at': datetime.now(timezone.utc).isoformat(), 'html': html}
+        content = zstandard.ZstdCompressor(level=self.level).compress(json.dumps(record).encode())
+        path = self.make_path(index)
+        makedir_exist_ok(os.path.dirname(path))
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as file:
+            file.write(content)
+        os.replace(tmp_path, path)
+        return
+
+    def get(self, index):
+        with open(self.make_path(index), 'rb') as file:
+            content = file.read()
+        record = json.loads(zstandard.ZstdDecompressor().decompress(content))
+        record['fetched_at'] = datetime.fromisoformat(record['fetched_at'])
+        return record
+
+    def indices(self):
+        if not os.path.exists(self.root):
+            return []
+        indices = []
+        for entry in os.scandir(self.root):
+            if entry.is_dir():
+                indices.extend(name[:-len('.zst')] for name in os.listdir(entry.path) if name.endswith('.zst'))
+        return sorted(indices)
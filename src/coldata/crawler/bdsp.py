@@ -1,12 +1,5 @@
-import hashlib
-import os
-import requests
-import time
-import trafilatura
 from bs4 import BeautifulSoup as bs
-from tqdm import tqdm
 from .crawler import Crawler
-from ..utils import save, load
 
 
 class BrainDataSciencePlatform(Crawler):
@@ -15,23 +8,22 @@ class BrainDataSciencePlatform(Crawler):
     def __init__(self, database, website=None, **kwargs):
         super().__init__(self.data_name, database, website, **kwargs)
         self.root_url = 'https://bdsp.io'
-        self.datasets = self.make_datasets()
+        self.datasets = self.make_datasets() if self.listing else []
         self.num_datasets = len(self.datasets)
 
     def make_datasets(self):
         if self.num_attempts is not None and self.num_attempts == 0:
             return []
 
-        cache_path = os.path.join(self.cache_dir, 'datasets')
-        if self.use_cache and os.path.exists(cache_path):
-            return load(cache_path)
+        if self.use_cache:
+            datasets = self.load_datasets()
+            if datasets is not None:
+                return datasets
 
         list_url = f'{self.root_url}/about/database/'
         print(f'Fetching dataset list from {list_url}...')
         try:
-            resp = requests.get(list_url)
-            resp.encoding = 'utf‑8'
-            resp.raise_for_status()
+            resp = self.get(list_url)
         except Exception as e:
             print(f'Error fetching page: {e}')
             return []
@@ -48,59 +40,17 @@ class BrainDataSciencePlatform(Crawler):
         datasets.remove('/content')
         datasets.remove('/content/?types=0')
         datasets = sorted(datasets)
-        save(datasets, cache_path)
+        self.save_datasets(datasets)
         return datasets
 
-    def make_data(self, url, soup):
-        index = hashlib.sha256(url.encode()).hexdigest()
+    def make_url(self, dataset):
+        return f'{self.root_url}{dataset}/'
+
+    def make_data(self, url, page, info):
+        index = self.make_index(url)
         return {
             'website': self.data_name,
             'index': index,
             'URL': url,
-            'info': trafilatura.extract(str(soup), output_format=self.parse['output_format'])
+            'info': info
         }
-
-    def crawl(self, is_upload=False):
-        if not self.attempts_check():
-            return
-
-        indices = range(min(self.num_attempts, len(self.datasets))) if self.num_attempts else range(len(self.datasets))
-        print(f'Start crawling ({self.data_name})...')
-        collected = []
-
-        for i in tqdm(indices):
-            rel = self.datasets[i]
-            full = f'{self.root_url}{rel}/'
-            idx = hashlib.sha256(full.encode()).hexdigest()
-
-            if self.database.collection.find_one({'index': idx}):
-                continue
-
-            try:
-                resp = requests.get(full)
-                resp.encoding = 'utf‑8'
-                resp.raise_for_status()
-                soup = bs(resp.text, 'html.parser')
-                data_i = self.make_data(full, soup)
-                if is_upload:
-                    self._upload_data(data_i, self.verbose)
-                else:
-                    collected.append(data_i)
-                if self.query_interval > 0:
-                    time.sleep(self.query_interval)
-            except Exception as e:
-                print(f'Failed to fetch {full}: {e}')
-                continue
-
-        return collected
-
-    def upload(self, data):
-        if not self.attempts_check():
-            return
-        print(f'Uploading ({self.data_name})...')
-        count = 0
-        for data_i in tqdm(data):
-            if self._upload_data(data_i, self.verbose):
-                count += 1
-        print(f'Inserted {count} records.')
-        return
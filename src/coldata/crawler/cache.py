@@ -0,0 +1,90 @@
+import os
+import sqlite3
+import threading
+from ..utils import makedir_exist_ok
+
+
+class SQLiteCache:
+    """
+    Table in an SQLite file shared by the fetch threads, committed every `commit_interval` updates and on save.
+    """
+
+    def __init__(self, path, schema, commit_interval=1000):
+        makedir_exist_ok(os.path.dirname(path))
+        self.path = path
+        self.commit_interval = commit_interval
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(schema)
+        self.lock = threading.Lock()
+        self.num_pending = 0
+
+    def query(self, sql, parameters):
+        with self.lock:
+            return self.connection.execute(sql, parameters).fetchone()
+
+    def write(self, sql, parameters):
+        with self.lock:
+            self.connection.execute(sql, parameters)
+            self.num_pending += 1
+            if self.num_pending >= self.commit_interval:
+                self.connection.commit()
+                self.num_pending = 0
+        return
+
+    def save(self):
+        with self.lock:
+            self.connection.commit()
+            self.num_pending = 0
+        return
+
+
+class ValidatorCache(SQLiteCache):
+    def __init__(self, path, commit_interval=1000):
+        super().__init__(path, 'CREATE TABLE IF NOT EXISTS validators '
+                               '(url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT)', commit_interval)
+
+    def headers(self, url):
+        """
+        Conditional request headers for url, empty if no ETag/Last-Modified was stored for it.
+        """
+        row = self.query('SELECT etag, last_modified FROM validators WHERE url = ?', (url,))
+        headers = {}
+        if row is not None:
+            etag, last_modified = row
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        return headers
+
+    def update(self, url, headers):
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if etag is None and last_modified is None:
+            self.write('DELETE FROM validators WHERE url = ?', (url,))
+        else:
+            self.write('INSERT OR REPLACE INTO validators VALUES (?, ?, ?)', (url, etag, last_modified))
+        return
+
+
+class ReadmeCache(SQLiteCache):
+    """
+    Text of a file per key, stored with the revision (e.g. a git sha) it was fetched at.
+    """
+
+    def __init__(self, path, commit_interval=1000):
+        super().__init__(path, 'CREATE TABLE IF NOT EXISTS readmes (key TEXT PRIMARY KEY, revision TEXT, text TEXT)',
+                         commit_interval)
+
+    def get(self, key, revision):
+        """
+        Text stored for key at revision, or None if there is none.
+        """
+        row = self.query('SELECT revision, text FROM readmes WHERE key = ?', (key,))
+        if row is None or revision is None or row[0] != revision:
+            return None
+        return row[1]
+
+    def update(self, key, revision, text):
+        self.write('INSERT OR REPLACE INTO readmes VALUES (?, ?, ?)', (key, revision, text))
+        return
@@ -0,0 +1,56 @@
+import os
+from ..utils import save, load
+
+
+class Checkpoint:
+    def __init__(self, path):
+        self.path = path
+        self.state = load(self.path, mode='pickle') if os.path.exists(self.path) else {}
+
+    def get(self, key, default=None):
+        return self.state.get(key, default)
+
+    def update(self, key, value):
+        self.state[key] = value
+        self.save()
+        return
+
+    def remove(self, key):
+        if key in self.state:
+            del self.state[key]
+            self.save()
+        return
+
+    def save(self):
+        if not self.state:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+        # Write to a temporary file first so that an interruption never leaves a truncated checkpoint
+        tmp_path = self.path + '.tmp'
+        save(self.state, tmp_path, mode='pickle')
+        os.replace(tmp_path, self.path)
+        return
+
+
+class Cursor:
+    """
+    Position below which every dataset has been processed, although datasets finish out of order.
+    """
+
+    def __init__(self, positions, end):
+        self.positions = positions
+        self.end = end
+        self.finished = set()
+        self.i = 0
+
+    def finish(self, position):
+        self.finished.add(position)
+        while self.i < len(self.positions) and self.positions[self.i] in self.finished:
+            self.finished.remove(self.positions[self.i])
+            self.i += 1
+        return
+
+    @property
+    def position(self):
+        return self.positions[self.i] if self.i < len(self.positions) else self.end
@@ -1,59 +1,502 @@
+import asyncio
+import hashlib
+import numpy as np
 import os
+import queue
+import requests
+import threading
 import time
 from abc import abstractmethod
+from datetime import datetime, timedelta, timezone
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlparse
 from tqdm import tqdm
+from .archive import Archive
+from .cache import ValidatorCache
+from .checkpoint import Checkpoint, Cursor
+from .metrics import Metrics
+from .pipeline import Pipeline
+from .ratelimit import RateLimiter
+from .utils import extract_info, parse_retry_after
+from ..mongodb import BulkWriter
+from ..utils import save, load
+
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class Retryable(Exception):
+    """
+    Raised by an attempt passed to Crawler.retry when it may be retried. `error` is raised once retries run out and
+    `retry_after` (seconds) overrides the backoff.
+    """
+
+    def __init__(self, error, retry_after=None):
+        super().__init__(str(error))
+        self.error = error
+        self.retry_after = retry_after
 
 
 class Crawler:
 
-    def __init__(self, data_name, database, website, parse, **kwargs):
+    def __init__(self, data_name, database, website, parse, listing=True, **kwargs):
         self.data_name = data_name
         self.database = database
+        # Without listing the dataset list is not built, e.g. to only re-extract archived pages
+        self.listing = listing
         self.num_attempts = website[self.data_name]['num_attempts']
         self.use_cache = website[self.data_name]['use_cache']
         self.query_interval = website[self.data_name]['query_interval']
         self.query_interval_scaler = website[self.data_name]['query_interval_scaler']
         self.verbose = website[self.data_name]['verbose']
+        self.max_age = website[self.data_name].get('max_age', None)
+        self.max_concurrency = website[self.data_name].get('max_concurrency', 1)
+        self.write_batch_size = website[self.data_name].get('write_batch_size', 1000)
+        self.max_retries = website[self.data_name].get('max_retries', 3)
+        self.timeout = website[self.data_name].get('timeout', 30)
+        self.checkpoint_interval = website[self.data_name].get('checkpoint_interval', 10)
         self.cache_dir = os.path.join('output', 'cache', self.data_name)
+        self.checkpoint = Checkpoint(os.path.join(self.cache_dir, 'checkpoint'))
+        self.archive = Archive(os.path.join('output', 'archive', self.data_name)) \
+            if website[self.data_name].get('archive', False) else None
         self.parse = parse
+        self.session = self.make_session()
+        self.rate_limiter = self.make_rate_limiter(website[self.data_name])
+        self.known_indices = np.array([], dtype='S32')
+        self.stale_indices = np.array([], dtype='S32')
+        self.validators = None
+        self.num_not_modified = 0
+        self.num_failed = 0
+        self.metrics = Metrics(self.data_name)
+        self.writer = BulkWriter(self.database.collection, batch_size=self.write_batch_size, verbose=self.verbose,
+                                 metrics=self.metrics)
 
-    @abstractmethod
     def crawl(self, is_upload=False):
+        if not self.attempts_check():
+            return
+        datasets = self.datasets if self.num_attempts is None else self.datasets[:self.num_attempts]
+        print(f'Start crawling ({self.data_name})...')
+        self.load_known_indices()
+        self.validators = ValidatorCache(os.path.join(self.cache_dir, 'validators.sqlite'))
+        start = self.load_detail_position(datasets) if is_upload else 0
+        urls = []
+        positions = []
+        pending = set()
+        for i in range(start, len(datasets)):
+            url_i = self.make_url(datasets[i])
+            index_i = self.make_index(url_i)
+            if not self.check_fresh(index_i) and index_i not in pending:
+                pending.add(index_i)
+                urls.append(url_i)
+                positions.append(i)
+        url_positions = dict(zip(urls, positions))
+        cursor = Cursor(positions, len(datasets))
+        data = []
+        with tqdm(total=len(urls)) as pbar:
+            def make_jobs():
+                for url_i, page_i in self.fetch_pages(urls):
+                    html_i = None if page_i is None or isinstance(page_i, Exception) else self.make_html(page_i)
+                    if html_i is None:
+                        yield (url_i, page_i), None
+                    else:
+                        yield (url_i, page_i), (html_i, self.parse['output_format'])
+
+            def write(item, info):
+                url_i, page_i = item
+                data_i = self._process_page(url_i, page_i, info, is_upload)
+                if data_i is not None:
+                    data.append(data_i)
+                pbar.update(1)
+                cursor.finish(url_positions[url_i])
+                if is_upload and pbar.n % self.write_batch_size == 0:
+                    self.writer.flush()
+                    self.save_detail_position(datasets, cursor.position)
+                return
+
+            pipeline = Pipeline(num_workers=self.parse.get('num_workers'), queue_size=self.parse.get('queue_size', 64),
+                                metrics=self.metrics)
+            pipeline.run(make_jobs(), extract_info, write)
+        self.writer.flush()
+        self.validators.save()
+        self.checkpoint.remove('detail')
+        return data
+
+    def _process_page(self, url, page, info, is_upload):
+        if isinstance(page, Exception):
+            tqdm.write(f'Failed to fetch {url}: {page}')
+            self.num_failed += 1
+            return None
+        if page is None:
+            self.num_not_modified += 1
+            if is_upload:
+                self.writer.touch(self.make_index(url), url)
+            return None
+        if self.archive is not None:
+            html = self.make_html(page)
+            if html is not None:
+                self.archive.put(self.make_index(url), url, html)
+        if isinstance(info, Exception):
+            tqdm.write(f'Failed to extract {url}: {info}')
+            self.num_failed += 1
+            return None
+        try:
+            data = self.make_data(url, page, info)
+        except Exception as e:
+            tqdm.write(f'Failed to process {url}: {e}')
+            self.num_failed += 1
+            return None
+        if is_upload:
+            self._upload_data(data, overwrite=self.check_index(data['index']))
+        return data
+
+    def reextract(self, is_upload=True):
         """
-        Process the raw data that has been crawled.
-        Subclasses must implement this method.
+        Rebuild the info of every archived page with the current parse settings, without fetching anything.
+        Records keep the crawl time of their archived page.
         """
-        pass
+        archive = Archive(os.path.join('output', 'archive', self.data_name))
+        indices = archive.indices()
+        print(f'Start re-extracting ({self.data_name}): {len(indices)} archived pages...')
+        data = []
+        with tqdm(total=len(indices)) as pbar:
+            def make_jobs():
+                for index_i in indices:
+                    try:
+                        record_i = archive.get(index_i)
+                    except Exception as e:
+                        tqdm.write(f'Failed to read archived page {index_i}: {e}')
+                        self.num_failed += 1
+                        pbar.update(1)
+                        continue
+                    yield record_i, (record_i.pop('html'), self.parse['output_format'])
+
+            def write(record, info):
+                pbar.update(1)
+                if isinstance(info, Exception):
+                    tqdm.write(f"Failed to extract {record['url']}: {info}")
+                    self.num_failed += 1
+                    return
+                try:
+                    data_i = self.make_data(record['url'], None, info)
+                except Exception as e:
+                    tqdm.write(f"Failed to process {record['url']}: {e}")
+                    self.num_failed += 1
+                    return
+                data_i['crawled_at'] = record['fetched_at']
+                if is_upload:
+                    self._upload_data(data_i, overwrite=True)
+                data.append(data_i)
+                return
+
+            pipeline = Pipeline(num_workers=self.parse.get('num_workers'), queue_size=self.parse.get('queue_size', 64),
+                                metrics=self.metrics)
+            pipeline.run(make_jobs(), extract_info, write)
+        self.writer.flush()
+        return data
+
+    def load_detail_position(self, datasets):
+        # Resume after the datasets that were already written, if the dataset list is unchanged
+        detail = self.checkpoint.get('detail')
+        if detail is None or detail['num_datasets'] != len(datasets):
+            return 0
+        print(f"Resume crawling ({self.data_name}) from {detail['position']}/{len(datasets)}")
+        return detail['position']
+
+    def save_detail_position(self, datasets, position):
+        self.checkpoint.update('detail', {'num_datasets': len(datasets), 'position': position})
+        return
+
+    def make_html(self, page):
+        """
+        Html passed to extract_info, or None if the page needs no extraction.
+        """
+        return page.text
 
     @abstractmethod
-    def upload(self, data):
+    def make_data(self, url, page, info):
         """
-        Upload the processed data to the MongoDB collection.
+        Process a fetched page and the text extracted from it into a record.
         Subclasses must implement this method.
         """
         pass
 
+    def upload(self, data):
+        if not self.attempts_check():
+            return
+        print('Start uploading ({})...'.format(self.data_name))
+        num_inserted = self.writer.num_inserted
+        for data_i in tqdm(data):
+            self._upload_data(data_i, overwrite=self.check_index(data_i['index']))
+        self.writer.flush()
+        print('Insert {} records.'.format(self.writer.num_inserted - num_inserted))
+        return
+
+    def summary(self):
+        summary = {'datasets': self.num_datasets, 'inserted': self.writer.num_inserted,
+                   'updated': self.writer.num_updated, 'unchanged': self.writer.num_unchanged,
+                   'not_modified': self.num_not_modified, 'skipped': self.writer.num_skipped,
+                   'failed': self.num_failed + self.writer.num_failed}
+        return summary
+
+    def load_datasets(self):
+        """
+        Cached dataset list, or None if there is none. Caches written by torch.save are migrated to text.
+        """
+        path = os.path.join(self.cache_dir, 'datasets.txt')
+        if os.path.exists(path):
+            return load(path, mode='text')
+        legacy_path = os.path.join(self.cache_dir, 'datasets')
+        if os.path.exists(legacy_path):
+            datasets = load(legacy_path)
+            self.save_datasets(datasets)
+            os.remove(legacy_path)
+            return datasets
+        return None
+
+    def save_datasets(self, datasets):
+        save(datasets, os.path.join(self.cache_dir, 'datasets.txt'), mode='text')
+        return
+
+    def save_metrics(self):
+        """
+        Write the metrics of this run to output/metrics/<website>.json and the Prometheus text file <website>.prom.
+        """
+        self.metrics.save(os.path.join('output', 'metrics', self.data_name), counts=self.summary())
+        return
+
+    def make_url(self, dataset):
+        return self.root_url + dataset
+
+    def make_index(self, url):
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    def load_indices(self, query=None):
+        """
+        Load the indices stored for this website with a single projected query.
+        They are kept as a sorted array of 32-byte sha256 digests and looked up with `check_index`.
+        """
+        query = {'website': self.data_name, **(query or {})}
+        cursor = self.database.collection.find(query, {'index': 1, '_id': 0}).batch_size(10000)
+        indices = np.array([bytes.fromhex(record['index']) for record in cursor if 'index' in record], dtype='S32')
+        indices.sort()
+        return indices
+
+    def load_known_indices(self):
+        # Stored records crawled more than `max_age` days ago (or never stamped) are stale and get re-fetched
+        self.known_indices = self.load_indices()
+        if self.max_age is None:
+            self.stale_indices = np.array([], dtype='S32')
+        else:
+            cutoff = datetime.now(timezone.utc) - timedelta(days=self.max_age)
+            self.stale_indices = self.load_indices({'$or': [{'crawled_at': {'$lt': cutoff}},
+                                                            {'crawled_at': {'$exists': False}}]})
+        return
+
+    def check_index(self, index, indices=None):
+        indices = self.known_indices if indices is None else indices
+        digest = np.array(bytes.fromhex(index), dtype='S32')
+        position = np.searchsorted(indices, digest)
+        return bool(position < len(indices) and indices[position] == digest)
+
+    def check_fresh(self, index):
+        return self.check_index(index) and not self.check_index(index, self.stale_indices)
+
+    def make_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.max_concurrency, pool_maxsize=self.max_concurrency,
+                              pool_block=True)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def make_rate_limiter(self, config):
+        # query_interval was the pause between two requests, so it sets the initial rate; max_rate caps the growth
+        rate = 1 / self.query_interval if self.query_interval > 0 else None
+        rate_limiter = RateLimiter(rate, min_rate=config.get('min_rate'), max_rate=config.get('max_rate'),
+                                   increase=config.get('rate_increase'), scaler=self.query_interval_scaler)
+        return rate_limiter
+
+    def retry(self, url, attempt):
+        """
+        Call attempt() until it returns, retrying up to `max_retries` times whenever it raises Retryable. The wait
+        starts at max(query_interval, 1) seconds and is multiplied by `query_interval_scaler` after every attempt,
+        unless the server asked for a Retry-After. Every attempt is paced by the per-host rate limiter, which slows
+        down on retries.
+        """
+        host = urlparse(url).netloc
+        query_interval = max(self.query_interval, 1.0)
+        for i in range(self.max_retries + 1):
+            self.rate_limiter.acquire(host)
+            try:
+                with self.metrics.timer('fetch_seconds'):
+                    result = attempt()
+            except Retryable as e:
+                self.rate_limiter.failure(host)
+                if i == self.max_retries:
+                    raise e.error
+                wait = query_interval if e.retry_after is None else e.retry_after
+                if self.verbose:
+                    tqdm.write(f'Retry {url} in {wait:.1f}s ({i + 1}/{self.max_retries}): {e.error}')
+                time.sleep(wait)
+                query_interval = query_interval * self.query_interval_scaler
+                continue
+            self.rate_limiter.success(host)
+            return result
+        return
+
+    def get(self, url, **kwargs):
+        """
+        GET url through the pooled session, retrying connection errors, timeouts and RETRY_STATUS responses
+        (see retry); 429/503 responses may set the wait with Retry-After.
+        """
+        def attempt():
+            try:
+                response = self.session.get(url, timeout=self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.metrics.inc('fetch_errors', error=type(e).__name__)
+                raise Retryable(e)
+            self.metrics.inc('http_responses', status=response.status_code)
+            self.metrics.inc('fetch_bytes', len(response.content))
+            if response.status_code in RETRY_STATUS:
+                retry_after = parse_retry_after(response.headers.get('Retry-After')) \
+                    if response.status_code in (429, 503) else None
+                raise Retryable(requests.HTTPError(f'HTTP {response.status_code}', response=response), retry_after)
+            response.raise_for_status()
+            response.encoding = 'utf-8'
+            return response
+
+        return self.retry(url, attempt)
+
+    def fetch(self, url):
+        """
+        Fetch url, revalidating stored records with their ETag/Last-Modified.
+        Return None if the server answers 304 Not Modified.
+        """
+        headers = {}
+        if self.validators is not None and self.check_index(self.make_index(url)):
+            headers = self.validators.headers(url)
+        page = self.get(url, headers=headers)
+        if page.status_code == 304:
+            return None
+        if self.validators is not None:
+            self.validators.update(url, page.headers)
+        return page
+
+    def fetch_pages(self, urls):
+        """
+        Fetch urls concurrently and yield (url, page) pairs in completion order.
+        At most `max_concurrency` requests are in flight per host; a failed fetch yields its exception.
+        """
+        pages = queue.Queue(maxsize=2 * self.max_concurrency)
+        stop = threading.Event()
+        thread = threading.Thread(target=asyncio.run, args=(self._fetch_pages(urls, pages, stop),), daemon=True)
+        thread.start()
+        try:
+            while True:
+                result = pages.get()
+                if result is None:
+                    break
+                yield result
+        finally:
+            stop.set()
+            thread.join()
+        return
+
+    async def _fetch_pages(self, urls, pages, stop):
+        semaphores = defaultdict(lambda: asyncio.Semaphore(self.max_concurrency))
+        pending = set()
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                for url in urls:
+                    if stop.is_set():
+                        break
+                    if len(pending) >= 2 * self.max_concurrency:
+                        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                        for task in done:
+                            self._put(pages, task.result(), stop)
+                    pending.add(asyncio.ensure_future(self._fetch_page(url, executor, semaphores)))
+                if pending:
+                    for task in asyncio.as_completed(pending):
+                        self._put(pages, await task, stop)
+        finally:
+            self._put(pages, None, stop)
+        return
+
+    async def _fetch_page(self, url, executor, semaphores):
+        loop = asyncio.get_running_loop()
+        async with semaphores[urlparse(url).netloc]:
+            try:
+                page = await loop.run_in_executor(executor, self.fetch, url)
+            except Exception as e:
+                page = e
+        return url, page
+
+    def _put(self, pages, result, stop):
+        while not stop.is_set():
+            try:
+                pages.put(result, timeout=1)
+                break
+            except queue.Full:
+                continue
+        return
+
+    def discover(self, keys, fetch_listing, init_page=0):
+        """
+        Page through the listing of every key (a label, a category...) concurrently, `max_concurrency` keys at a
+        time, all paced by the shared rate limiter. `fetch_listing(key, page)` returns the dataset links on a page;
+        a key ends at an empty page or at a page that repeats the previous one. Links are deduplicated across keys
+        and the progress of every key is checkpointed, so an interrupted discovery resumes. A key whose listing fails
+        is left unfinished for the next run to resume, and the result is then reported as incomplete.
+        Returns the links and whether the discovery is complete, i.e. whether they may be cached.
+        """
+        discovery = self.checkpoint.get('discovery')
+        if discovery is None or 'keys' not in discovery:
+            discovery = {'keys': {}, 'datasets': []}
+        datasets = discovery['datasets']
+        seen = set(datasets)
+        lock = threading.Lock()
+        stop = threading.Event()
+
+        def run(key):
+            with lock:
+                state = discovery['keys'].setdefault(key, {'page': init_page, 'last': None, 'done': False})
+            while not state['done'] and not stop.is_set():
+                page = state['page']
+                try:
+                    result = fetch_listing(key, page)
+                except Exception as e:
+                    tqdm.write(f'Error fetching datasets on {key} and page {page}, resumed on the next run: {e}')
+                    break
+                with lock:
+                    if not result or result == state['last']:
+                        state['done'] = True
+                        break
+                    new = [link for link in dict.fromkeys(result) if link not in seen]
+                    seen.update(new)
+                    datasets.extend(new)
+                    state.update(page=page + 1, last=result)
+                    if self.num_attempts is not None and len(datasets) >= self.num_attempts:
+                        stop.set()
+                    if (page + 1 - init_page) % self.checkpoint_interval == 0:
+                        self.checkpoint.update('discovery', discovery)
+            with lock:
+                self.checkpoint.update('discovery', discovery)
+            return
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            list(executor.map(run, keys))
+        if stop.is_set():
+            print('Reached the maximum number of attempts: {}'.format(self.num_attempts))
+        complete = stop.is_set() or all(discovery['keys'].get(key, {}).get('done') for key in keys)
+        if complete:
+            self.checkpoint.remove('discovery')
+        return list(datasets), complete
+
     def attempts_check(self):
         return self.num_attempts is None or (isinstance(self.num_attempts, int) and self.num_attempts > 0)
 
-    def _upload_data(self, data, verbose=True):
-        existing_data = self.database.collection.find_one({'index': data['index']})
-        is_insert = False
-        if existing_data is None:
-            self.database.collection.insert_one(data)
-            is_insert = True
-        if verbose:
-            if is_insert:
-                tqdm.write('Insert: {}'.format(data['URL']))
-            else:
-                tqdm.write('Exist and skip: {}'.format(data['URL']))
-        return is_insert
-
-    def _insert_data(self, data_i, is_upload):
-        if is_upload:
-            is_insert = self._upload_data(data_i, self.verbose)
-        else:
-            is_insert = False
-        if is_insert and self.query_interval > 0:
-            time.sleep(self.query_interval)
+    def _upload_data(self, data, overwrite=False):
+        self.writer.add(data, overwrite)
         return
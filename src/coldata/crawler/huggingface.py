@@ -1,11 +1,7 @@
-import hashlib
 import os
 import requests
-import time
-import trafilatura
-from bs4 import BeautifulSoup as bs
-from tqdm import tqdm
 from huggingface_hub import HfApi, list_datasets, dataset_info
+from .cache import ReadmeCache
 from .crawler import Crawler
 from ..utils import save, load
 
@@ -17,31 +13,82 @@ class HuggingFace(Crawler):
         super().__init__(self.data_name, database, website, **kwargs)
         self.root_url = 'https://huggingface.co/datasets/'
         self.api = HfApi()
-        self.datasets = self.make_datasets()
+        self.fetch_readme = website[self.data_name].get('fetch_readme', True)
+        # The README of a dataset only changes with its sha, so it is fetched again only then
+        self.readmes = ReadmeCache(os.path.join(self.cache_dir, 'readmes.sqlite')) if self.fetch_readme else None
+        self.metadata = {}
+        self.datasets = self.make_datasets() if self.listing else []
         self.num_datasets = len(self.datasets)
 
     def make_datasets(self):
         if self.num_attempts is not None and self.num_attempts == 0:
             return []
 
-        cache_path = os.path.join(self.cache_dir, 'datasets')
-        if self.use_cache and os.path.exists(cache_path):
-            return load(cache_path)
+        metadata_path = os.path.join(self.cache_dir, 'metadata')
+        if self.use_cache:
+            datasets = self.load_datasets()
+            if datasets is not None:
+                if os.path.exists(metadata_path):
+                    # Caches written before the sha was kept hold the structured text only
+                    self.metadata = {dataset_id: metadata if isinstance(metadata, tuple) else (metadata, None)
+                                     for dataset_id, metadata in load(metadata_path, mode='pickle').items()}
+                return datasets
 
+        # One paginated stream carries the card data and stats of every dataset
         datasets = []
         attempts_count = 0
-        for ds in list_datasets():
+        for ds in list_datasets(full=True):
             datasets.append(ds.id)
+            self.metadata[ds.id] = (self.make_structured_text(ds), ds.sha)
             attempts_count += 1
             if self.num_attempts is not None and attempts_count >= self.num_attempts:
                 print('Reached the maximum number of attempts: {}'.format(self.num_attempts))
                 break
-        save(datasets, cache_path)
+        self.save_datasets(datasets)
+        save(self.metadata, metadata_path, mode='pickle')
         return datasets
 
-    def make_data(self, metadata, url, index, soup):
-        # Extract and clean HTML
-        html_text = trafilatura.extract(str(soup), output_format=self.parse['output_format'])
+    def make_readme_url(self, url):
+        return f'{url}/raw/main/README.md'
+
+    def fetch(self, url):
+        """
+        Structured metadata from the listing and, if `fetch_readme`, the raw README.md of the dataset card.
+        The README is downloaded only if the listing sha differs from the one it was stored at, and the record is
+        always rebuilt, so that the listing metadata (downloads, likes...) stays fresh.
+        """
+        dataset_id = url[len(self.root_url):]
+        metadata = self.metadata.get(dataset_id)
+        if metadata is None:
+            # Listings cached before the metadata was kept
+            info = dataset_info(dataset_id)
+            metadata = (self.make_structured_text(info), info.sha)
+        structured_text, sha = metadata
+        if not self.fetch_readme:
+            return structured_text, None
+        readme = self.readmes.get(dataset_id, sha)
+        if readme is not None:
+            return structured_text, readme
+        try:
+            readme = self.get(self.make_readme_url(url)).text
+        except requests.HTTPError as e:
+            if e.response is None or e.response.status_code != 404:
+                raise
+            readme = ''
+        self.readmes.update(dataset_id, sha, readme)
+        return structured_text, readme
+
+    def crawl(self, is_upload=False):
+        data = super().crawl(is_upload)
+        if self.readmes is not None:
+            self.readmes.save()
+        return data
+
+    def make_html(self, page):
+        # The README is markdown already, so there is nothing to extract
+        return None
+
+    def make_structured_text(self, metadata):
         # Convert structured metadata into string format
         structured_info = {
             "ID": metadata.id,
@@ -53,60 +100,32 @@ class HuggingFace(Crawler):
             "Likes": metadata.likes,
             "Tags": ", ".join(metadata.tags) if metadata.tags else "",
             "SHA": metadata.sha,
-            "Created at": metadata.created_at.isoformat(),
-            "Last modified": metadata.last_modified.isoformat(),
+            "Created at": metadata.created_at.isoformat() if metadata.created_at else "",
+            "Last modified": metadata.last_modified.isoformat() if metadata.last_modified else "",
             "License": metadata.cardData.get("license") if metadata.cardData else "",
             "Pretty name": metadata.cardData.get("pretty_name") if metadata.cardData else "",
             "Description (card)": metadata.cardData.get("description") if metadata.cardData else "",
         }
         # Format structured info as a readable string block
         structured_text = "\n".join(f"{k}: {v}" for k, v in structured_info.items() if v)
+        return structured_text
+
+    def make_data(self, url, page, info):
+        structured_text, readme = page
+        index = self.make_index(url)
+        # Text of the dataset card without its YAML header, which the structured metadata already covers
+        card_text = strip_front_matter(readme) if readme else ""
         # Combine structured and unstructured parts into one string
-        combined_info = structured_text + "\n\n" + (html_text or "")
+        combined_info = structured_text + "\n\n" + card_text
         info = combined_info.strip()
         # Final data record
         data = {"website": self.data_name, "index": index, "URL": url, "info": info}
         return data
 
-    def crawl(self, is_upload=False):
-        if not self.attempts_check():
-            return
-        if self.num_attempts is not None:
-            indices = range(min(self.num_attempts, len(list(self.datasets))))
-        else:
-            indices = range(len(list(self.datasets)))
-        print(f'Start crawling ({self.data_name})...')
-        data = []
-        for i in tqdm(indices):
-            dataset_id = self.datasets[i]
-            url_i = self.root_url + dataset_id
-            index_i = hashlib.sha256(url_i.encode()).hexdigest()
-            existing_data = self.database.collection.find_one({'index': index_i})
-            if existing_data is None:
-                try:
-                    metadata = dataset_info(dataset_id)
-                    page_i = requests.get(url_i)
-                    soup_i = bs(page_i.text, 'html.parser')
-                    main_card = soup_i.find('div', class_='prose')
-                    data_i = self.make_data(metadata, url_i, index_i, main_card)
-                    if is_upload:
-                        self._upload_data(data_i, self.verbose)
-                    else:
-                        if self.query_interval > 0:
-                            time.sleep(self.query_interval)
-                    data.append(data_i)
-                except Exception as e:
-                    print(f"Error processing {dataset_id}: {e}")
-        return data
 
-    def upload(self, data):
-        if not self.attempts_check():
-            return
-        count = 0
-        print('Start uploading ({})...'.format(self.data_name))
-        for data_i in tqdm(data):
-            is_insert = self._upload_data(data_i, self.verbose)
-            if is_insert:
-                count += 1
-        print('Insert {} records.'.format(count))
-        return
+def strip_front_matter(text):
+    if text.startswith('---'):
+        end = text.find('\n---', 3)
+        if end != -1:
+            return text[end + 4:].lstrip('\n')
+    return text
@@ -1,12 +1,6 @@
-import hashlib
-import kaggle
-import json
 import os
 import pandas as pd
-import time
-from tqdm import tqdm
-from .crawler import Crawler
-from ..utils import save, load
+from .crawler import Crawler, Retryable, RETRY_STATUS
 
 
 class Kaggle(Crawler):
@@ -16,10 +10,13 @@ class Kaggle(Crawler):
         super().__init__(self.data_name, database, website, **kwargs)
         self.root_url = 'https://www.kaggle.com/datasets/'
         self.init_page = website[self.data_name]['init_page']
-        self.tmp_metadata_filename = 'dataset-metadata.json'
-        self.api = kaggle.KaggleApi()
-        self.api.authenticate()
-        self.datasets = self.make_datasets()
+        # Importing kaggle authenticates, so it is deferred until a Kaggle crawler lists datasets
+        self.api = None
+        if self.listing:
+            from kaggle.api.kaggle_api_extended import KaggleApi
+            self.api = KaggleApi()
+            self.api.authenticate()
+        self.datasets = self.make_datasets() if self.listing else []
         self.num_datasets = len(self.datasets)
 
     def make_datasets(self):
@@ -27,9 +24,10 @@ class Kaggle(Crawler):
             datasets = []
             return datasets
 
-        if self.use_cache and os.path.exists(os.path.join(self.cache_dir, 'datasets')):
-            datasets = load(os.path.join(self.cache_dir, 'datasets'))
-            return datasets
+        if self.use_cache:
+            datasets = self.load_datasets()
+            if datasets is not None:
+                return datasets
 
         # download https://www.kaggle.com/datasets/kaggle/meta-kaggle
         csv_names = ['DatasetVersions.csv', 'Datasets.csv', 'Users.csv', 'Organizations.csv']
@@ -40,46 +38,86 @@ class Kaggle(Crawler):
                 os.system(dataset_version_cmd)
 
         # https://chatgpt.com/share/67ee33ba-3a3c-8003-98c0-fcd8f84ff40b
-        # Step 1: Load all CSVs
-        dataset_versions = pd.read_csv(os.path.join(self.cache_dir, 'DatasetVersions.csv'))
-        datasets = pd.read_csv(os.path.join(self.cache_dir, 'Datasets.csv'), low_memory=False)
-        users = pd.read_csv(os.path.join(self.cache_dir, 'Users.csv'))
-        orgs = pd.read_csv(os.path.join(self.cache_dir, 'Organizations.csv'))
+        slugs = self.load_slugs(csv_names)
+
+        # Get unique <owner>/<dataset-name> slugs
+        datasets = slugs['slug'].dropna().drop_duplicates().tolist()
+
+        self.save_datasets(datasets)
+        return datasets
+
+    def load_slugs(self, csv_names):
+        """
+        Owner and dataset slug of every meta-kaggle dataset version, cached as Parquet until the CSVs change.
+        """
+        slugs_path = os.path.join(self.cache_dir, 'slugs.parquet')
+        csv_paths = [os.path.join(self.cache_dir, csv_name) for csv_name in csv_names]
+        if os.path.exists(slugs_path) and all(os.path.getmtime(slugs_path) >= os.path.getmtime(path)
+                                              for path in csv_paths):
+            return pd.read_parquet(slugs_path)
+
+        # Step 1: Load only the needed columns of each CSV
+        dataset_versions = self.read_csv('DatasetVersions.csv', {'DatasetId': 'int64', 'Slug': 'string'})
+        datasets = self.read_csv('Datasets.csv', {'Id': 'int64', 'OwnerUserId': 'Int64',
+                                                  'OwnerOrganizationId': 'Int64'})
+        users = self.read_csv('Users.csv', {'Id': 'int64', 'UserName': 'string'})
+        orgs = self.read_csv('Organizations.csv', {'Id': 'int64', 'Slug': 'string'})
 
         # Step 2: Get unique DatasetId and corresponding Slug
-        latest_versions = dataset_versions[['DatasetId', 'Slug']].drop_duplicates()
+        latest_versions = dataset_versions.drop_duplicates()
 
         # Step 3: Join with Datasets.csv to get owner ids
         merged = latest_versions.merge(datasets, left_on='DatasetId', right_on='Id', how='left')
 
         # Step 4: Map UserId to UserName
-        merged = merged.merge(users[['Id', 'UserName']], left_on='OwnerUserId', right_on='Id', how='left',
-                              suffixes=('', '_User'))
+        merged = merged.merge(users, left_on='OwnerUserId', right_on='Id', how='left', suffixes=('', '_User'))
 
         # Step 5: Map OrganizationId to Slug
-        merged = merged.merge(orgs[['Id', 'Slug']], left_on='OwnerOrganizationId', right_on='Id', how='left',
-                              suffixes=('', '_Org'))
+        merged = merged.merge(orgs, left_on='OwnerOrganizationId', right_on='Id', how='left', suffixes=('', '_Org'))
 
         # Step 6: Determine owner name (UserName or Org Slug)
-        def resolve_owner(row):
-            if pd.notna(row['UserName']):
-                return row['UserName']
-            elif pd.notna(row['Slug_Org']):
-                return row['Slug_Org']
-            return None
-
-        merged['owner'] = merged.apply(resolve_owner, axis=1)
+        merged['owner'] = merged['UserName'].fillna(merged['Slug_Org'])
 
         # Step 7: Create the final <owner>/<dataset-name> slug
         merged['slug'] = merged['owner'] + '/' + merged['Slug']
 
-        # Step 8: Get unique slugs
-        datasets = merged['slug'].dropna().drop_duplicates().tolist()
-
-        save(datasets, os.path.join(self.cache_dir, 'datasets'))
-        return datasets
-
-    def make_data(self, metadata, url, index):
+        slugs = merged[['DatasetId', 'owner', 'Slug', 'slug']]
+        slugs.to_parquet(slugs_path, index=False)
+        return slugs
+
+    def read_csv(self, csv_name, dtype):
+        return pd.read_csv(os.path.join(self.cache_dir, csv_name), usecols=list(dtype), dtype=dtype, engine='pyarrow')
+
+    def fetch(self, url):
+        """
+        Parsed metadata of the dataset at url, fetched in memory through the Kaggle API.
+        RETRY_STATUS responses are retried like Crawler.get.
+        """
+        from kaggle.rest import ApiException
+        owner_slug, dataset_slug = url[len(self.root_url):].split('/')[:2]
+
+        def attempt():
+            try:
+                result = self.api.process_response(self.api.metadata_get_with_http_info(owner_slug, dataset_slug))
+            except ApiException as e:
+                self.metrics.inc('http_responses', status=e.status)
+                if e.status in RETRY_STATUS:
+                    raise Retryable(e)
+                raise
+            self.metrics.inc('http_responses', status=200)
+            return result
+
+        result = self.retry(url, attempt)
+        if result.get('errorMessage'):
+            raise Exception(result['errorMessage'])
+        return result['info']
+
+    def make_html(self, page):
+        # The API returns parsed metadata, so there is nothing to extract
+        return None
+
+    def make_data(self, url, page, info):
+        metadata = page
         structured_info = {
             "id": metadata.get("id", ""),
             "title": metadata.get("title", ""),
@@ -103,47 +141,5 @@ class Kaggle(Crawler):
         # Combine structured and unstructured parts into one string
         info = structured_text.strip()
         # Final data record
-        data = {"website": self.data_name, "index": index, "URL": url, "info": info}
+        data = {"website": self.data_name, "index": self.make_index(url), "URL": url, "info": info}
         return data
-
-    def crawl(self, is_upload=False):
-        if not self.attempts_check():
-            return
-        if self.num_attempts is not None:
-            indices = range(min(self.num_attempts, len(list(self.datasets))))
-        else:
-            indices = range(len(list(self.datasets)))
-        if os.path.exists(os.path.join(self.cache_dir, self.tmp_metadata_filename)):
-            os.remove(os.path.join(self.cache_dir, self.tmp_metadata_filename))
-        data = []
-        for i in tqdm(indices):
-            dataset = self.datasets[i]
-            url_i = self.root_url + dataset
-            index_i = hashlib.sha256(url_i.encode()).hexdigest()
-            existing_data = self.database.collection.find_one({'index': index_i})
-            if existing_data is None:
-                self.api.dataset_metadata(dataset, path=self.cache_dir)
-                with open(os.path.join(self.cache_dir, self.tmp_metadata_filename), 'r') as file:
-                    json_str = json.load(file)
-                    metadatda_i = json.loads(json_str)
-                data_i = self.make_data(metadatda_i, url_i, index_i)
-                os.remove(os.path.join(self.cache_dir, self.tmp_metadata_filename))
-                if is_upload:
-                    self._upload_data(data_i, self.verbose)
-                else:
-                    if self.query_interval > 0:
-                        time.sleep(self.query_interval)
-                data.append(data_i)
-        return data
-
-    def upload(self, data):
-        if not self.attempts_check():
-            return
-        count = 0
-        print('Start uploading ({})...'.format(self.data_name))
-        for data_i in tqdm(data):
-            is_insert = self._upload_data(data_i, self.verbose)
-            if is_insert:
-                count += 1
-        print('Insert {} records.'.format(count))
-        return
@@ -0,0 +1,115 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from ..utils import makedir_exist_ok
+
+# Upper bounds (seconds) of the histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float('inf'))
+
+
+class Metrics:
+    """
+    Counters and histograms of one crawl, updated from the fetch, extraction and writer threads.
+    Counters may carry labels, e.g. inc('http_responses', status=200).
+    """
+
+    def __init__(self, data_name):
+        self.data_name = data_name
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+        return
+
+    def observe(self, name, value):
+        with self.lock:
+            if name not in self.histograms:
+                self.histograms[name] = {'buckets': [0] * len(BUCKETS), 'count': 0, 'sum': 0.0, 'max': 0.0}
+            histogram = self.histograms[name]
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    histogram['buckets'][i] += 1
+                    break
+            histogram['count'] += 1
+            histogram['sum'] += value
+            histogram['max'] = max(histogram['max'], value)
+        return
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def quantile(self, histogram, q):
+        # Upper bound of the bucket holding the q-quantile
+        rank = q * histogram['count']
+        count = 0
+        for bound, bucket in zip(BUCKETS, histogram['buckets']):
+            count += bucket
+            if count >= rank:
+                return min(bound, histogram['max'])
+        return histogram['max']
+
+    def summary(self, counts=None):
+        with self.lock:
+            counters = {}
+            for (name, labels), value in sorted(self.counters.items()):
+                if labels:
+                    counters.setdefault(name, {})[','.join(f'{k}={v}' for k, v in labels)] = value
+                else:
+                    counters[name] = value
+            histograms = {}
+            for name, histogram in sorted(self.histograms.items()):
+                mean = histogram['sum'] / histogram['count'] if histogram['count'] else 0
+                histograms[name] = {'count': histogram['count'], 'sum': histogram['sum'], 'mean': mean,
+                                    'p50': self.quantile(histogram, 0.5), 'p95': self.quantile(histogram, 0.95),
+                                    'max': histogram['max']}
+        summary = {'website': self.data_name, 'counts': counts or {}, 'counters': counters, 'histograms': histograms}
+        return summary
+
+    def to_prometheus(self, counts=None):
+        website = f'website="{self.data_name}"'
+        lines = []
+        with self.lock:
+            for key, value in sorted((counts or {}).items()):
+                lines.append(f'# TYPE coldata_crawl_{key} gauge')
+                lines.append(f'coldata_crawl_{key}{{{website}}} {value}')
+            names = sorted({name for name, _ in self.counters})
+            for name in names:
+                lines.append(f'# TYPE coldata_crawl_{name}_total counter')
+                for (name_i, labels), value in sorted(self.counters.items()):
+                    if name_i == name:
+                        label_text = ''.join(f',{k}="{v}"' for k, v in labels)
+                        lines.append(f'coldata_crawl_{name}_total{{{website}{label_text}}} {value}')
+            for name, histogram in sorted(self.histograms.items()):
+                lines.append(f'# TYPE coldata_crawl_{name} histogram')
+                count = 0
+                for bound, bucket in zip(BUCKETS, histogram['buckets']):
+                    count += bucket
+                    le = '+Inf' if bound == float('inf') else bound
+                    lines.append(f'coldata_crawl_{name}_bucket{{{website},le="{le}"}} {count}')
+                lines.append(f"coldata_crawl_{name}_sum{{{website}}} {histogram['sum']}")
+                lines.append(f"coldata_crawl_{name}_count{{{website}}} {histogram['count']}")
+        return '\n'.join(lines) + '\n'
+
+    def save(self, path, counts=None):
+        """
+        Write <path>.json and the Prometheus text file <path>.prom.
+        """
+        makedir_exist_ok(os.path.dirname(path))
+        with open(f'{path}.json', 'w') as file:
+            json.dump(self.summary(counts), file, indent=2, default=str)
+        with open(f'{path}.prom.tmp', 'w') as file:
+            file.write(self.to_prometheus(counts))
+        # The textfile collector must never read a partially written file
+        os.replace(f'{path}.prom.tmp', f'{path}.prom')
+        return
@@ -1,14 +1,23 @@
-import time
-import hashlib
-import os
-import trafilatura
-from bs4 import BeautifulSoup as bs
+import queue
+import threading
 from tqdm import tqdm
+from urllib.parse import urlparse
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
 from .crawler import Crawler
-from ..utils import save, load
+
+# Images, fonts and stylesheets are not needed to read the rendered text
+BLOCKED_URLS = ['*.png', '*.jpg', '*.jpeg', '*.gif', '*.svg', '*.webp', '*.ico',
+                '*.woff', '*.woff2', '*.ttf', '*.otf', '*.css']
+CARD_SELECTOR = 'a._cardContainer_1vhh8_1'
+PAGINATION_SELECTOR = 'li.ant-pagination-item'
+# Dataset introduction, rendered client-side after the navigation
+DETAIL_SELECTOR = 'div.markdown-body, article'
 
 
 class OpenDataLab(Crawler):
@@ -19,112 +28,180 @@ class OpenDataLab(Crawler):
         self.root_url = 'https://opendatalab.com'
         self.init_page = website[self.data_name]['init_page']
         self.num_datasets_per_query = website[self.data_name]['num_datasets_per_query']
+        self.num_drivers = website[self.data_name].get('num_drivers', 1)
+        self.page_timeout = website[self.data_name].get('page_timeout', 30)
+        self.detail_selector = website[self.data_name].get('detail_selector', DETAIL_SELECTOR)
         self.chromedriver_path = selenium.get('chromedriver_path')
-        self.driver = self._initialize_driver()
-        self.datasets = self.make_datasets()
+        self.datasets = self.make_datasets() if self.listing else []
         self.num_datasets = len(self.datasets)
 
     def _initialize_driver(self):
         options = Options()
         options.add_argument('--headless')
         options.add_argument('--disable-gpu')
+        options.add_argument('--blink-settings=imagesEnabled=false')
+        options.page_load_strategy = 'eager'
         service = Service(self.chromedriver_path)
         driver = webdriver.Chrome(service=service, options=options)
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URLS})
         return driver
 
+    def run_drivers(self, tasks, fn):
+        """
+        Run fn(driver, task) for every task on a pool of `num_drivers` headless drivers fed from a work queue.
+        Yield (task, result) pairs in completion order; a failed task yields its exception.
+        """
+        work = queue.Queue()
+        for task in tasks:
+            work.put(task)
+        num_tasks = work.qsize()
+        if num_tasks == 0:
+            return
+        results = queue.Queue()
+        stop = threading.Event()
+        workers = [threading.Thread(target=self._run_driver, args=(work, results, stop, fn), daemon=True)
+                   for _ in range(min(self.num_drivers, num_tasks))]
+        for worker in workers:
+            worker.start()
+        try:
+            for _ in range(num_tasks):
+                yield results.get()
+        finally:
+            stop.set()
+            for worker in workers:
+                worker.join()
+        return
+
+    def _run_driver(self, work, results, stop, fn):
+        try:
+            driver = self._initialize_driver()
+            error = None
+        except Exception as e:
+            driver = None
+            error = e
+        while not stop.is_set():
+            try:
+                task = work.get_nowait()
+            except queue.Empty:
+                break
+            if driver is None:
+                results.put((task, error))
+                continue
+            try:
+                result = fn(driver, task)
+            except Exception as e:
+                result = e
+            results.put((task, result))
+        if driver is not None:
+            driver.quit()
+        return
+
+    def make_page_url(self, page):
+        return f'{self.root_url}/?pageNo={page}&pageSize={self.num_datasets_per_query}&sort=all'
+
+    def load_page(self, driver, url, condition, **kwargs):
+        """
+        Load url once the rate limiter allows it and wait for condition; timeouts slow the rate down.
+        """
+        host = urlparse(url).netloc
+        self.rate_limiter.acquire(host)
+        try:
+            with self.metrics.timer('fetch_seconds'):
+                driver.get(url)
+                result = WebDriverWait(driver, self.page_timeout, **kwargs).until(condition)
+        except TimeoutException:
+            self.metrics.inc('page_loads', status='timeout')
+            self.rate_limiter.failure(host)
+            raise
+        self.metrics.inc('page_loads', status='rendered')
+        self.rate_limiter.success(host)
+        return result
+
+    def fetch_last_page(self, driver, page):
+        self.load_page(driver, self.make_page_url(page),
+                       EC.presence_of_element_located((By.CSS_SELECTOR, PAGINATION_SELECTOR)))
+        pagination_items = driver.find_elements(By.CSS_SELECTOR, PAGINATION_SELECTOR)
+        return int(pagination_items[-1].get_attribute('title'))
+
+    def fetch_listing(self, driver, page):
+        self.load_page(driver, self.make_page_url(page),
+                       EC.presence_of_element_located((By.CSS_SELECTOR, CARD_SELECTOR)))
+        result = []
+        for card in driver.find_elements(By.CSS_SELECTOR, CARD_SELECTOR):
+            href = card.get_attribute('href')
+            if href:
+                result.append(self.root_url + href if not href.startswith('http') else href)
+        return result
+
     def make_datasets(self):
         if self.num_attempts is not None and self.num_attempts == 0:
             datasets = []
             return datasets
 
-        if self.use_cache and os.path.exists(os.path.join(self.cache_dir, 'datasets')):
-            datasets = load(os.path.join(self.cache_dir, 'datasets'))
-            return datasets
+        if self.use_cache:
+            datasets = self.load_datasets()
+            if datasets is not None:
+                return datasets
 
-        attempts_count = 0
-        datasets = []
-        url = f'{self.root_url}/?pageNo=1&pageSize={self.num_datasets_per_query}&sort=all'
-        self.driver.get(url)
-        time.sleep(5)
-        soup = bs(self.driver.page_source, 'html.parser')
-        pagination_items = soup.find_all('li', class_='ant-pagination-item')
-        last_page = int(list(pagination_items)[-1].get('title'))
-
-        for page in range(self.init_page, last_page + 1):
-            query_interval = self.query_interval
-            try:
-                url = f'{self.root_url}/?pageNo={page}&pageSize={self.num_datasets_per_query}&sort=all'
-                print(f'Fetching page: {url}')
-                self.driver.get(url)
-                time.sleep(self.query_interval)
-                soup = bs(self.driver.page_source, 'html.parser')
-                cards = soup.find_all('a', class_='_cardContainer_1vhh8_1')
-                result = []
-                for card in cards:
-                    href = card.get('href')
-                    if href:
-                        result.append(self.root_url + href if not href.startswith('http') else href)
-                datasets.extend(result)
+        _, last_page = list(self.run_drivers([1], self.fetch_last_page))[0]
+        if isinstance(last_page, Exception):
+            print('Error fetching the number of pages: {}'.format(last_page))
+            return []
+
+        # Listing pages finish out of order, so the checkpoint records the result of every completed page
+        discovery = self.checkpoint.get('discovery', {'pages': {}})
+        attempts_count = sum(len(result) for result in discovery['pages'].values())
+        pages = [page for page in range(self.init_page, last_page + 1) if page not in discovery['pages']]
+        reached_attempts = self.num_attempts is not None and attempts_count >= self.num_attempts
+        if not reached_attempts:
+            for page, result in tqdm(self.run_drivers(pages, self.fetch_listing), total=len(pages)):
+                if isinstance(result, Exception):
+                    tqdm.write('Error fetching datasets on page {}, resumed on the next run: {}'.format(page, result))
+                    continue
+                discovery['pages'][page] = result
                 attempts_count += len(result)
+                if len(discovery['pages']) % self.checkpoint_interval == 0:
+                    self.checkpoint.update('discovery', discovery)
                 if self.num_attempts is not None and attempts_count >= self.num_attempts:
+                    print('Reached the maximum number of attempts: {}'.format(self.num_attempts))
+                    reached_attempts = True
                     break
-            except Exception as e:
-                print('Error fetching datasets on page {}: {}'.format(page, e))
-                query_interval = query_interval * self.query_interval_scaler
-                time.sleep(query_interval)
-            if self.num_attempts is not None and attempts_count >= self.num_attempts:
-                print('Reached the maximum number of attempts: {}'.format(self.num_attempts))
-                break
+        complete = reached_attempts or len(discovery['pages']) == last_page - self.init_page + 1
+        if complete:
+            self.checkpoint.remove('discovery')
+        else:
+            self.checkpoint.update('discovery', discovery)
+        datasets = [url for result in discovery['pages'].values() for url in result]
         datasets = sorted(datasets, key=lambda x: x.split('/')[-1])
-        save(datasets, os.path.join(self.cache_dir, 'datasets'))
+        # Failed pages are resumed from the checkpoint, so an incomplete list is not cached
+        if complete:
+            self.save_datasets(datasets)
         return datasets
 
-    def make_data(self, url):
-        query_interval = self.query_interval
-        while True:
-            self.driver.get(url)
-            time.sleep(query_interval)
-            soup = bs(self.driver.page_source, 'html.parser')
-            index = hashlib.sha256(url.encode()).hexdigest()
-            data = {}
-            data['website'] = self.data_name
-            data['index'] = index
-            data['URL'] = url
-            data['info'] = trafilatura.extract(str(soup), output_format=self.parse['output_format'])
-            if '首页' in data['info']:
-                query_interval = query_interval * self.query_interval_scaler
-            else:
-                break
-        return data
+    def fetch_pages(self, urls):
+        # Detail pages are rendered by the drivers instead of fetched through the session
+        return self.run_drivers(urls, self.fetch_page)
 
-    def crawl(self, is_upload=False):
-        if not self.attempts_check():
-            return
-        if self.num_attempts is not None:
-            indices = range(min(self.num_attempts, len(list(self.datasets))))
-        else:
-            indices = range(len(list(self.datasets)))
-        print(f'Start crawling ({self.data_name})...')
-        data = []
-        for i in tqdm(indices):
-            url_i = self.datasets[i]
-            index_i = hashlib.sha256(url_i.encode()).hexdigest()
-            existing_data = self.database.collection.find_one({'index': index_i})
-            if existing_data is None:
-                data_i = self.make_data(url_i)
-                if is_upload:
-                    self._upload_data(data_i, self.verbose)
-                data.append(data_i)
-        return data
+    def fetch_page(self, driver, url):
+        # The page is rendered client-side, so it is read once its content is present
+        self.load_page(driver, url, EC.presence_of_element_located((By.CSS_SELECTOR, self.detail_selector)))
+        return driver.page_source
 
-    def upload(self, data):
-        if not self.attempts_check():
-            return
-        count = 0
-        print('Start uploading ({})...'.format(self.data_name))
-        for data_i in tqdm(data):
-            is_insert = self._upload_data(data_i, self.verbose)
-            if is_insert:
-                count += 1
-        print('Insert {} records.'.format(count))
-        return
+    def make_url(self, dataset):
+        return dataset
+
+    def make_html(self, page):
+        return page
+
+    def make_data(self, url, page, info):
+        # Until the content is rendered only the navigation ('首页') is extracted
+        if not info or '首页' in info:
+            raise ValueError('Page content was not rendered')
+        index = self.make_index(url)
+        data = {}
+        data['website'] = self.data_name
+        data['index'] = index
+        data['URL'] = url
+        data['info'] = info
+        return data
@@ -0,0 +1,67 @@
+import copy
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from .pipeline import make_mp_context
+from ..mongodb import MongoDB
+
+
+def run_crawler(data_name, mode, config, is_upload=True):
+    # Runs in its own process with its own MongoDB client, so sources never share a connection or a GIL
+    from .. import crawler
+    start = time.time()
+    summary = {'website': data_name}
+    try:
+        database = MongoDB(mode=mode, profile='ingest', **config['mongodb'])
+        source = getattr(crawler, data_name)(database, **config['crawler'])
+        source.crawl(is_upload=is_upload)
+        source.save_metrics()
+        summary.update(source.summary())
+        summary['status'] = 'done'
+    except Exception as e:
+        traceback.print_exc()
+        summary['status'] = f'failed ({e})'
+    summary['time'] = time.time() - start
+    return summary
+
+
+def run_crawlers(mode, config, sources, num_workers=1, max_concurrency=None, is_upload=True):
+    """
+    Crawl the sources concurrently, at most `num_workers` at a time.
+    Each source keeps the rate limits of its own crawler.website section, while the extraction processes and, if
+    `max_concurrency` is set, the requests in flight are budgets shared by the sources running at once.
+    """
+    config = split_budget(config, num_workers, max_concurrency)
+    summaries = {}
+    # The caller may hold a MongoClient, whose monitor threads could leave locks held in forked children
+    with ProcessPoolExecutor(max_workers=num_workers, mp_context=make_mp_context()) as executor:
+        futures = [executor.submit(run_crawler, data_name, mode, config, is_upload) for data_name in sources]
+        for future in as_completed(futures):
+            summary = future.result()
+            print(f"Finished crawling ({summary['website']}): {summary['status']} in {summary['time']:.0f}s")
+            summaries[summary['website']] = summary
+    summaries = [summaries[data_name] for data_name in sources]
+    print_summary(summaries)
+    return summaries
+
+
+def split_budget(config, num_workers, max_concurrency=None):
+    # Every source builds its own extraction pool, so parse.num_workers (all cores if null) is divided among them
+    config = copy.deepcopy(config)
+    parse = config['crawler']['parse']
+    parse['num_workers'] = max(1, (parse.get('num_workers') or os.cpu_count() or 1) // num_workers)
+    if max_concurrency is not None:
+        concurrency = max(1, max_concurrency // num_workers)
+        for website in config['crawler']['website'].values():
+            website['max_concurrency'] = min(website.get('max_concurrency', 1), concurrency)
+    return config
+
+
+def print_summary(summaries):
+    keys = ['datasets', 'inserted', 'updated', 'unchanged', 'not_modified', 'skipped', 'failed']
+    print(f"{'Website':<26}{'Time (s)':>10}" + ''.join(f'{key:>14}' for key in keys) + '  Status')
+    for summary in summaries:
+        counts = ''.join(f"{summary.get(key, '-'):>14}" for key in keys)
+        print(f"{summary['website']:<26}{summary['time']:>10.0f}{counts}  {summary['status']}")
+    return
@@ -0,0 +1,81 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, as_completed, wait
+from tqdm import tqdm
+
+
+class Pipeline:
+    """
+    Fetch, extraction and write stages connected by bounded queues.
+    Jobs come from the fetch stage, `extract` runs on them in a process pool while the next pages are still being
+    downloaded, and `write` consumes the results in a single writer thread.
+    """
+
+    def __init__(self, num_workers=None, queue_size=64, metrics=None):
+        self.num_workers = num_workers if num_workers is not None else os.cpu_count()
+        self.queue_size = queue_size
+        self.metrics = metrics
+
+    def run(self, jobs, extract, write):
+        """
+        jobs yields (item, args) pairs; `extract(*args)` is computed in the process pool unless args is None.
+        `write(item, result)` receives the extraction result, None, or the exception raised by `extract`.
+        """
+        results = queue.Queue(maxsize=self.queue_size)
+        writer = threading.Thread(target=self._write, args=(results, write))
+        writer.start()
+        try:
+            # Forked workers would copy the locks of the fetch and writer threads, possibly while held
+            with ProcessPoolExecutor(max_workers=self.num_workers, mp_context=make_mp_context()) as executor:
+                futures = {}
+                for item, args in jobs:
+                    if args is None:
+                        results.put((item, None))
+                        continue
+                    if len(futures) >= self.queue_size:
+                        done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                        self._put(results, futures, done)
+                    futures[executor.submit(timed, extract, *args)] = item
+                self._put(results, futures, as_completed(list(futures)))
+        finally:
+            results.put(None)
+            writer.join()
+        return
+
+    def _put(self, results, futures, done):
+        for future in done:
+            item = futures.pop(future)
+            try:
+                result, seconds = future.result()
+                if self.metrics is not None:
+                    self.metrics.observe('extract_seconds', seconds)
+            except Exception as e:
+                result = e
+            results.put((item, result))
+        return
+
+    def _write(self, results, write):
+        while True:
+            result = results.get()
+            if result is None:
+                break
+            try:
+                write(*result)
+            except Exception as e:
+                tqdm.write(f'Failed to write: {e}')
+        return
+
+
+def make_mp_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def timed(fn, *args):
+    # Runs in the worker process, so the time excludes queueing and result transfer
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
@@ -1,12 +1,6 @@
-import hashlib
-import os
-import requests
-import time
-import trafilatura
 from bs4 import BeautifulSoup as bs
 from tqdm import tqdm
 from .crawler import Crawler
-from ..utils import save, load
 
 
 class PapersWithCode(Crawler):
@@ -16,7 +10,7 @@ class PapersWithCode(Crawler):
         super().__init__(self.data_name, database, website, **kwargs)
         self.init_page = website[self.data_name]['init_page']
         self.root_url = 'https://paperswithcode.com'
-        self.datasets = self.make_datasets()
+        self.datasets = self.make_datasets() if self.listing else []
         self.num_datasets = len(self.datasets)
 
     def make_datasets(self):
@@ -24,12 +18,12 @@ class PapersWithCode(Crawler):
             datasets = []
             return datasets
 
-        if self.use_cache and os.path.exists(os.path.join(self.cache_dir, 'datasets')):
-            datasets = load(os.path.join(self.cache_dir, 'datasets'))
-            return datasets
+        if self.use_cache:
+            datasets = self.load_datasets()
+            if datasets is not None:
+                return datasets
 
-        response = requests.get(self.root_url + '/datasets')
-        response.encoding = 'utf-8'
+        response = self.get(self.root_url + '/datasets')
         soup = bs(response.content, 'html.parser')
         modality_div = soup.find('div', class_='filter-name', string=lambda t: t and 'Filter by Modality' in t)
         modality_section = modality_div.find_parent()
@@ -37,90 +31,30 @@ class PapersWithCode(Crawler):
         labels = [a.find(text=True, recursive=False).strip() for a in modality_filters]
         labels = [label.lower().replace(' ', '-') for label in labels]
 
-        attempts_count = 0
-        datasets = []
-        last_result = None
-        for label in labels:
-            page = self.init_page
-            while True:
-                query_interval = self.query_interval
-                try:
-                    url = self.root_url + '/datasets/' + f'?mod={label}&page={page}'
-                    print(f'Fetching page: {url}')
-                    response = requests.get(url)
-                    time.sleep(query_interval)
-                    response.encoding = 'utf-8'
-                    soup = bs(response.content, 'html.parser')
-                    dataset_links = soup.select('a[href^="/dataset"]')
-                    attempts_count += len(dataset_links)
-                    result = []
-                    for link in dataset_links:
-                        if link['href'].split('/')[-1] != 'datasets':
-                            result.append(link['href'])
-                    datasets.extend(result)
-                    attempts_count += len(result)
-                    if last_result == tuple(result):
-                        print('No datasets found on label {} and page {}.'.format(label, page))
-                        break
-                    else:
-                        last_result = tuple(result)
-                    if self.num_attempts is not None and attempts_count >= self.num_attempts:
-                        break
-                    page += 1
-                except Exception as e:
-                    print('Error fetching datasets on page {}: {}'.format(page, e))
-                    query_interval = query_interval * self.query_interval_scaler
-                    time.sleep(query_interval)
-            if self.num_attempts is not None and attempts_count >= self.num_attempts:
-                print('Reached the maximum number of attempts: {}'.format(self.num_attempts))
-                break
+        datasets, complete = self.discover(labels, self.fetch_listing, init_page=self.init_page)
         datasets = sorted(datasets, key=lambda x: x.split('/')[-1])
-        save(datasets, os.path.join(self.cache_dir, 'datasets'))
+        if complete:
+            self.save_datasets(datasets)
         return datasets
 
-    def make_data(self, url, soup):
-        index = hashlib.sha256(url.encode()).hexdigest()
+    def fetch_listing(self, label, page):
+        url = self.root_url + '/datasets/' + f'?mod={label}&page={page}'
+        if self.verbose:
+            tqdm.write(f'Fetching page: {url}')
+        response = self.get(url)
+        soup = bs(response.content, 'html.parser')
+        dataset_links = soup.select('a[href^="/dataset"]')
+        result = []
+        for link in dataset_links:
+            if link['href'].split('/')[-1] != 'datasets':
+                result.append(link['href'])
+        return result
+
+    def make_data(self, url, page, info):
+        index = self.make_index(url)
         data = {}
         data['website'] = self.data_name
         data['index'] = index
         data['URL'] = url
-        data['info'] = trafilatura.extract(str(soup), output_format=self.parse['output_format'])
+        data['info'] = info
         return data
-
-    def crawl(self, is_upload=False):
-        if not self.attempts_check():
-            return
-        if self.num_attempts is not None:
-            indices = range(min(self.num_attempts, len(list(self.datasets))))
-        else:
-            indices = range(len(list(self.datasets)))
-        print(f'Start crawling ({self.data_name})...')
-        data = []
-        for i in tqdm(indices):
-            dataset = self.datasets[i]
-            url_i = self.root_url + dataset
-            index_i = hashlib.sha256(url_i.encode()).hexdigest()
-            existing_data = self.database.collection.find_one({'index': index_i})
-            if existing_data is None:
-                page_i = requests.get(url_i)
-                soup_i = bs(page_i.text, 'html.parser')
-                data_i = self.make_data(url_i, soup_i)
-                if is_upload:
-                    self._upload_data(data_i, self.verbose)
-                else:
-                    if self.query_interval > 0:
-                        time.sleep(self.query_interval)
-                data.append(data_i)
-        return data
-
-    def upload(self, data):
-        if not self.attempts_check():
-            return
-        count = 0
-        print('Start uploading ({})...'.format(self.data_name))
-        for data_i in tqdm(data):
-            is_insert = self._upload_data(data_i, self.verbose)
-            if is_insert:
-                count += 1
-        print('Insert {} records.'.format(count))
-        return
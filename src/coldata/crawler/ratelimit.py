@@ -0,0 +1,65 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Token bucket per host whose rate adapts with AIMD: it grows by `increase` requests/s after every success and
+    is divided by `scaler` after every throttled or failed request, within [min_rate, max_rate].
+    A rate of None disables limiting.
+    """
+
+    def __init__(self, rate, min_rate=None, max_rate=None, increase=None, scaler=2, burst=1):
+        self.rate = rate
+        if rate is not None:
+            self.min_rate = min_rate if min_rate is not None else rate / 16
+            self.max_rate = max_rate if max_rate is not None else rate * 8
+            self.increase = increase if increase is not None else rate / 10
+        self.scaler = scaler
+        self.burst = burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def _bucket(self, host):
+        if host not in self.buckets:
+            self.buckets[host] = {'rate': self.rate, 'tokens': self.burst, 'updated': time.monotonic()}
+        return self.buckets[host]
+
+    def acquire(self, host):
+        """
+        Block until a request to host is allowed.
+        """
+        if self.rate is None:
+            return
+        while True:
+            with self.lock:
+                bucket = self._bucket(host)
+                now = time.monotonic()
+                bucket['tokens'] = min(self.burst, bucket['tokens'] + (now - bucket['updated']) * bucket['rate'])
+                bucket['updated'] = now
+                if bucket['tokens'] >= 1:
+                    bucket['tokens'] -= 1
+                    return
+                wait = (1 - bucket['tokens']) / bucket['rate']
+            time.sleep(wait)
+
+    def success(self, host):
+        if self.rate is None:
+            return
+        with self.lock:
+            bucket = self._bucket(host)
+            bucket['rate'] = min(self.max_rate, bucket['rate'] + self.increase)
+        return
+
+    def failure(self, host):
+        if self.rate is None:
+            return
+        with self.lock:
+            bucket = self._bucket(host)
+            bucket['rate'] = max(self.min_rate, bucket['rate'] / self.scaler)
+        return
+
+    def rates(self):
+        with self.lock:
+            rates = {host: bucket['rate'] for host, bucket in self.buckets.items()}
+        return rates
@@ -1,5 +1,8 @@
 import re
 import string
+import time
+import trafilatura
+from email.utils import parsedate_to_datetime
 
 
 def clean_text(text):
@@ -34,3 +37,24 @@ def join_content(content_list):
         content_list = [add_punctuation(s) for s in content_list if len(s) > 0]
     content = " ".join(content_list)
     return content
+
+
+def parse_retry_after(value):
+    # Retry-After is either a number of seconds or an HTTP date
+    if value is None:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+def extract_info(html, output_format):
+    # Runs in the extraction process pool, so it only takes and returns plain strings.
+    # The raw html goes straight to trafilatura, which parses it once
+    info = trafilatura.extract(html, output_format=output_format)
+    return info
@@ -1 +1,2 @@
-from .mongodb import MongoDB
\ No newline at end of file
+from .mongodb import MongoDB
+from .writer import BulkWriter
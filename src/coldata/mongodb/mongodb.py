@@ -1,41 +1,170 @@
 import pymongo
+import time
 from collections import defaultdict
 
 
 class MongoDB:
-    def __init__(self, mode, key, collection_name='dataset', index_field='index'):
+    def __init__(self, mode, key, collection_name='dataset', index_field='index', client=None, profile=None):
         self.mode = mode
         self.key = key[mode]
         self.collection_name = collection_name
+        # Client options (pool size, compressors, timeouts, write concern, read preference) of the usage profile
+        self.profile = profile
+        self.client_options = dict((client or {}).get(profile) or {}) if profile is not None else {}
         try:
-            self.client = pymongo.MongoClient(self.key['string'])
+            self.client = pymongo.MongoClient(self.key['string'], **self.client_options)
             self.db = self.client[self.key['db_name']]
             self.collection = self.db[self.collection_name]
-            print(f"Connected to mongodb: {self.key['db_name']} ({self.collection_name})")
+            print(f"Connected to mongodb: {self.key['db_name']} ({self.collection_name}, profile: {self.profile})")
             self.create_index(index_field)
+            # Cover the per-website index queries of the crawlers, which would otherwise read every document
+            self.create_compound_index([('website', pymongo.ASCENDING), (index_field, pymongo.ASCENDING)])
+            self.create_compound_index([('website', pymongo.ASCENDING), ('crawled_at', pymongo.ASCENDING),
+                                        (index_field, pymongo.ASCENDING)])
         except Exception as e:
             raise Exception(f"Failed to connect to MongoDB: {e}")
 
-    def create_index(self, field):
+    def create_index(self, field, unique=True):
         try:
-            existing_indexes = self.collection.index_information()
-            if field not in existing_indexes:
-                self.collection.create_index([(field, pymongo.ASCENDING)], name=field)
+            indexes = self.find_indexes(field)
+            if not indexes:
+                self.collection.create_index([(field, pymongo.ASCENDING)], name=field, unique=unique)
                 print(f"Index created for {field}")
+            elif unique and not any(index.get('unique', False) for index in indexes.values()):
+                print(f"Index for {field} is not unique, run migrate_unique_index('{field}') to replace it")
         except Exception as e:
             raise Exception(f"Failed to create index: {e}")
         return
 
+    def create_compound_index(self, keys):
+        name = '_'.join(field for field, _ in keys)
+        try:
+            if name not in self.collection.index_information():
+                self.collection.create_index(keys, name=name)
+                print(f"Index created for {name}")
+        except Exception as e:
+            raise Exception(f"Failed to create index: {e}")
+        return
+
+    def find_indexes(self, field):
+        # Single-field indexes on field, in either direction
+        return {name: info for name, info in self.collection.index_information().items()
+                if [key for key, _ in info['key']] == [field]}
+
+    def find_duplicates(self, field):
+        pipeline = [
+            {'$group': {'_id': f'${field}', 'count': {'$sum': 1}}},
+            {'$match': {'count': {'$gt': 1}}},
+        ]
+        results = self.collection.aggregate(pipeline, allowDiskUse=True)
+        duplicates = {result['_id']: result['count'] for result in results}
+        return duplicates
+
+    def migrate_unique_index(self, field, dedup=False):
+        """
+        Replace a non-unique index on field by a unique one. Duplicated values are reported, or with `dedup` only the
+        most recently updated record of each is kept. The unique index is built before the old one is dropped, so the
+        collection is never left without an index.
+        """
+        indexes = self.find_indexes(field)
+        if any(index.get('unique', False) for index in indexes.values()):
+            return
+        duplicates = self.find_duplicates(field)
+        if duplicates:
+            if not dedup:
+                raise Exception(f"{len(duplicates)} values of {field} are duplicated (e.g. {next(iter(duplicates))}), "
+                                f"pass dedup=True to keep only the most recently updated record of each")
+            for value in duplicates:
+                records = self.collection.find({field: value}, {'_id': 1}).sort([('updated_at', -1), ('_id', -1)])
+                self.collection.delete_many({'_id': {'$in': [record['_id'] for record in records][1:]}})
+            print(f"Removed the duplicates of {len(duplicates)} values of {field}")
+        # A key pattern may only have one index, so the unique index is built descending next to the old ascending one
+        self.collection.create_index([(field, pymongo.DESCENDING)], name=f'{field}_unique', unique=True)
+        print(f"Unique index created for {field}")
+        for name in indexes:
+            self.collection.drop_index(name)
+            print(f"Index {name} dropped for {field} (not unique)")
+        return
+
+    def scan(self, query=None, projection=None, batch_size=1000, refresh_interval=300):
+        """
+        Iterate over the matching records with a cursor that does not time out while the caller is slow (e.g. while
+        embedding). The server session is refreshed every `refresh_interval` seconds so that it stays alive as well.
+        """
+        with self.client.start_session() as session:
+            with self.collection.find(query or {}, projection, no_cursor_timeout=True, batch_size=batch_size,
+                                      session=session) as cursor:
+                refreshed_at = time.monotonic()
+                for record in cursor:
+                    yield record
+                    if time.monotonic() - refreshed_at > refresh_interval:
+                        self.client.admin.command('refreshSessions', [session.session_id], session=session)
+                        refreshed_at = time.monotonic()
+        return
+
     def collection_structure(self, sample_size=100):
         schema = defaultdict(set)
         try:
-            cursor = self.collection.find().limit(sample_size)
-            for doc in cursor:
-                for key, value in doc.items():
-                    schema[key].add(type(value).__name__)
-            print(f"Structure of 'dataset' collection:")
+            for key, value_types in self.field_types(sample_size).items():
+                schema[key].update(value_types)
+            print(f"Structure of '{self.collection_name}' collection:")
             for key, value_types in schema.items():
-                print(f"{key}: {', '.join(value_types)}")
+                print(f"{key}: {', '.join(sorted(value_types))}")
         except Exception as e:
             raise Exception(f"Error analyzing collection structure: {e}")
         return schema
+
+    def field_types(self, sample_size=1000):
+        """
+        Number of documents holding each field with each BSON type, over a random server-side sample.
+        """
+        pipeline = [
+            {'$sample': {'size': sample_size}},
+            {'$project': {'fields': {'$objectToArray': '$$ROOT'}}},
+            {'$unwind': '$fields'},
+            {'$group': {'_id': {'field': '$fields.k', 'type': {'$type': '$fields.v'}}, 'count': {'$sum': 1}}},
+            {'$sort': {'_id.field': 1, 'count': -1}},
+        ]
+        types = defaultdict(dict)
+        for result in self.collection.aggregate(pipeline, allowDiskUse=True):
+            types[result['_id']['field']][result['_id']['type']] = result['count']
+        return dict(types)
+
+    def statistics(self, sample_size=None):
+        """
+        Per-website document count, size of `info` (average and p95 bytes), document size, freshness of
+        `crawled_at` and number of records waiting to be embedded, computed server-side.
+        The p95 needs MongoDB 7.0 ($percentile) and is None on older servers.
+        """
+        info_bytes = {'$cond': [{'$eq': [{'$type': '$info'}, 'string']}, {'$strLenBytes': '$info'}, 0]}
+        group = {'_id': '$website', 'count': {'$sum': 1},
+                 'avg_info_bytes': {'$avg': info_bytes},
+                 'avg_document_bytes': {'$avg': {'$bsonSize': '$$ROOT'}},
+                 'total_bytes': {'$sum': {'$bsonSize': '$$ROOT'}},
+                 'oldest_crawled_at': {'$min': '$crawled_at'},
+                 'newest_crawled_at': {'$max': '$crawled_at'},
+                 'not_embedded': {'$sum': {'$cond': [{'$ifNull': ['$embedded_at', False]}, 0, 1]}}}
+        percentile = {'p95_info_bytes': {'$percentile': {'input': info_bytes, 'p': [0.95], 'method': 'approximate'}}}
+        pipeline = [{'$sample': {'size': sample_size}}] if sample_size is not None else []
+        try:
+            results = list(self.collection.aggregate(pipeline + [{'$group': {**group, **percentile}},
+                                                                 {'$sort': {'_id': 1}}], allowDiskUse=True))
+        except pymongo.errors.OperationFailure:
+            results = list(self.collection.aggregate(pipeline + [{'$group': group}, {'$sort': {'_id': 1}}],
+                                                     allowDiskUse=True))
+        statistics = {}
+        for result in results:
+            website = result.pop('_id')
+            p95 = result.pop('p95_info_bytes', None)
+            result['p95_info_bytes'] = p95[0] if p95 else None
+            statistics[website] = result
+        return statistics
+
+    def print_statistics(self, sample_size=None):
+        statistics = self.statistics(sample_size)
+        keys = ['count', 'avg_info_bytes', 'p95_info_bytes', 'total_bytes', 'not_embedded']
+        print(f"{'Website':<26}" + ''.join(f'{key:>16}' for key in keys) + f"{'Newest crawl':>28}")
+        for website, result in statistics.items():
+            values = ''.join(f"{result[key]:>16.0f}" if result[key] is not None else f"{'-':>16}" for key in keys)
+            print(f"{str(website):<26}{values}{str(result['newest_crawled_at']):>28}")
+        return statistics
@@ -0,0 +1,127 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from tqdm import tqdm
+
+
+class BulkWriter:
+    def __init__(self, collection, batch_size=1000, mode='upsert', verbose=True, metrics=None):
+        self.collection = collection
+        self.metrics = metrics
+        self.batch_size = batch_size
+        self.mode = mode
+        self.verbose = verbose
+        self.buffer = []
+        self.num_inserted = 0
+        self.num_updated = 0
+        self.num_unchanged = 0
+        self.num_skipped = 0
+        self.num_failed = 0
+
+    def add(self, data, overwrite=False):
+        data['content_hash'] = self.make_hash(data)
+        self.buffer.append(('update' if overwrite else 'insert', data))
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+        return
+
+    def touch(self, index, url):
+        # The stored record is still current, only its crawl time moves forward
+        self.buffer.append(('touch', {'index': index, 'URL': url}))
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+        return
+
+    def make_hash(self, data):
+        return hashlib.sha256((data.get('info') or '').encode()).hexdigest()
+
+    def make_operations(self, buffer, now):
+        update_indices = [data['index'] for action, data in buffer if action == 'update']
+        if update_indices:
+            cursor = self.collection.find({'index': {'$in': update_indices}}, {'index': 1, 'content_hash': 1, '_id': 0})
+            hashes = {record['index']: record.get('content_hash') for record in cursor}
+        else:
+            hashes = {}
+        actions = []
+        operations = []
+        for action, data in buffer:
+            if action == 'update' and hashes.get(data['index']) == data['content_hash']:
+                action = 'touch'
+            if action == 'insert':
+                operation = UpdateOne({'index': data['index']}, {'$setOnInsert': data}, upsert=True)
+            elif action == 'update':
+                # Dropping embedded_at marks the record for re-embedding
+                operation = UpdateOne({'index': data['index']}, {'$set': data, '$unset': {'embedded_at': ''}},
+                                      upsert=True)
+            else:
+                operation = UpdateOne({'index': data['index']}, {'$max': {'crawled_at': data.get('crawled_at', now)}})
+            actions.append(action)
+            operations.append(operation)
+        return actions, operations
+
+    def flush(self):
+        """
+        Write the buffered records in one unordered round trip.
+        Duplicates are rejected by the unique index on `index`, so an existing record is skipped unless it was
+        added with `overwrite`, in which case it is only rewritten if its content hash changed.
+        The 'insert' mode uses insert_many for batches of new records only.
+        """
+        if not self.buffer:
+            return
+        buffer, self.buffer = self.buffer, []
+        if self.mode not in ['upsert', 'insert']:
+            raise ValueError('Not valid write mode')
+        now = datetime.now(timezone.utc)
+        for action, data in buffer:
+            if action != 'touch':
+                # Records rebuilt from an archive keep the time their page was fetched
+                data.setdefault('crawled_at', now)
+                data['updated_at'] = now
+        is_insert = self.mode == 'insert' and all(action == 'insert' for action, _ in buffer)
+        start = time.perf_counter()
+        try:
+            if is_insert:
+                actions = ['insert'] * len(buffer)
+                self.collection.insert_many([data for _, data in buffer], ordered=False)
+                inserted = set(range(len(buffer)))
+            else:
+                actions, operations = self.make_operations(buffer, now)
+                result = self.collection.bulk_write(operations, ordered=False)
+                inserted = set(result.upserted_ids.keys())
+            errors = []
+        except BulkWriteError as e:
+            if is_insert:
+                inserted = set(range(len(buffer)))
+            else:
+                inserted = {upserted['index'] for upserted in e.details['upserted']}
+            errors = e.details['writeErrors']
+        if self.metrics is not None:
+            self.metrics.observe('write_seconds', time.perf_counter() - start)
+        failed = set()
+        for error in errors:
+            inserted.discard(error['index'])
+            # 11000 is a duplicate key, i.e. the record already exists
+            if error['code'] != 11000:
+                failed.add(error['index'])
+                tqdm.write('Failed to write {}: {}'.format(buffer[error['index']][1]['URL'], error['errmsg']))
+        self.num_failed += len(failed)
+        for i, (action, (_, data)) in enumerate(zip(actions, buffer)):
+            if i in failed:
+                continue
+            if i in inserted:
+                self.num_inserted += 1
+                message = 'Insert'
+            elif action == 'update':
+                self.num_updated += 1
+                message = 'Update'
+            elif action == 'touch':
+                self.num_unchanged += 1
+                message = 'Unchanged'
+            else:
+                self.num_skipped += 1
+                message = 'Exist and skip'
+            if self.verbose:
+                tqdm.write('{}: {}'.format(message, data['URL']))
+        return
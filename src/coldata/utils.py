@@ -1,7 +1,7 @@
+import gzip
 import numpy as np
 import os
 import pickle
-import torch
 
 
 def check_exists(path):
@@ -17,12 +17,17 @@ def save(input, path, mode='torch'):
     dirname = os.path.dirname(path)
     makedir_exist_ok(dirname)
     if mode == 'torch':
+        import torch
         torch.save(input, path)
     elif mode == 'np':
         np.save(path, input, allow_pickle=True)
     elif mode == 'pickle':
         with open(path, 'wb') as file:
             pickle.dump(input, file)
+    elif mode == 'text':
+        # One string per line, gzip-compressed if the path ends with .gz
+        with open_text(path, 'wt') as file:
+            file.write(''.join(f'{line}\n' for line in input))
     else:
         raise ValueError('Not valid save mode')
     return
@@ -30,12 +35,22 @@ def save(input, path, mode='torch'):
 
 def load(path, mode='torch'):
     if mode == 'torch':
+        import torch
         output = torch.load(path, weights_only=False)
     elif mode == 'np':
         output = np.load(path, allow_pickle=True)
     elif mode == 'pickle':
         with open(path, 'rb') as file:
             output = pickle.load(file)
+    elif mode == 'text':
+        with open_text(path, 'rt') as file:
+            output = file.read().splitlines()
     else:
         raise ValueError('Not valid save mode')
     return output
+
+
+def open_text(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode, encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
@@ -0,0 +1,93 @@
+import os
+import re
+import sqlite3
+import threading
+from ..utils import makedir_exist_ok
+
+# CJK characters are indexed one by one, everything else as runs of word characters
+TOKEN_PATTERN = re.compile(r'[぀-ヿ㐀-䶿一-鿿가-힯]|[^\W぀-ヿ㐀-䶿一-鿿가-힯]+')
+
+
+class BM25:
+    """
+    BM25 index over chunk texts, keyed by the same <record index>_<chunk number> ids as the Milvus vectors.
+    Postings live on disk in an SQLite FTS5 table ranked with its bm25() function (k1=1.2, b=0.75), so neither
+    loading nor updating the index holds it in memory, and every change is persisted by a transaction commit.
+    """
+
+    def __init__(self, path):
+        makedir_exist_ok(os.path.dirname(path))
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.make_tables()
+
+    def make_tables(self):
+        # Chunk ids and their record live in a plain table, so chunks are found by record through an index
+        self.connection.execute('CREATE TABLE IF NOT EXISTS chunks '
+                                '(id INTEGER PRIMARY KEY, chunk TEXT UNIQUE, record TEXT)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS chunks_record ON chunks (record)')
+        self.connection.execute('CREATE VIRTUAL TABLE IF NOT EXISTS postings USING fts5(text)')
+        self.connection.commit()
+        return
+
+    def tokenize(self, text):
+        return TOKEN_PATTERN.findall(text.lower())
+
+    def add(self, indices, texts):
+        with self.lock:
+            for index, text in zip(indices, texts):
+                row = self.connection.execute('SELECT id FROM chunks WHERE chunk = ?', (index,)).fetchone()
+                if row is not None:
+                    rowid = row[0]
+                    self.connection.execute('DELETE FROM postings WHERE rowid = ?', (rowid,))
+                else:
+                    rowid = self.connection.execute('INSERT INTO chunks (chunk, record) VALUES (?, ?)',
+                                                    (index, self.make_record_index(index))).lastrowid
+                # Stored pre-tokenized, so FTS5 splits on the same boundaries as the queries
+                self.connection.execute('INSERT INTO postings (rowid, text) VALUES (?, ?)',
+                                        (rowid, ' '.join(self.tokenize(text))))
+        return
+
+    def remove_records(self, record_indices):
+        with self.lock:
+            for record_index in record_indices:
+                rowids = [(rowid,) for rowid, in self.connection.execute('SELECT id FROM chunks WHERE record = ?',
+                                                                          (record_index,))]
+                self.connection.executemany('DELETE FROM postings WHERE rowid = ?', rowids)
+                self.connection.execute('DELETE FROM chunks WHERE record = ?', (record_index,))
+        return
+
+    def search(self, query, limit=10):
+        """
+        Chunk ids and scores of the `limit` best matches of query, best first.
+        """
+        terms = set(self.tokenize(query))
+        if not terms:
+            return []
+        match = ' OR '.join(f'"{term}"' for term in terms)
+        with self.lock:
+            rows = self.connection.execute('SELECT chunks.chunk, bm25(postings) AS score FROM postings '
+                                           'JOIN chunks ON chunks.id = postings.rowid WHERE postings MATCH ? '
+                                           'ORDER BY score LIMIT ?', (match, limit)).fetchall()
+        # bm25() is lower for better matches
+        return [(index, -score) for index, score in rows]
+
+    def make_record_index(self, index):
+        return index.split('_')[0]
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM chunks').fetchone()[0]
+
+    def reset(self):
+        with self.lock:
+            self.connection.execute('DROP TABLE IF EXISTS chunks')
+            self.connection.execute('DROP TABLE IF EXISTS postings')
+            self.make_tables()
+        return
+
+    def save(self):
+        with self.lock:
+            self.connection.commit()
+        return
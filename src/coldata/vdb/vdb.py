@@ -1,15 +1,21 @@
+import os
 from langchain.schema import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from pymilvus import connections, utility, DataType, FieldSchema, CollectionSchema, Collection
 from collections import OrderedDict
+from datetime import datetime, timezone
+from pymongo import UpdateOne
 from tqdm import tqdm
+from .bm25 import BM25
 from .embed import Embedding
 
 
 class VDB:
     def __init__(self, collection_name='dataset', alias='default', host='localhost', port='19530',
                  index_type='IVF_FLAT', metric_type='IP', nlist=1024, nprobe=1024, limit=4, renew=True,
-                 page_limit=100, batch_size=128, show_progress=True,
+                 page_limit=100, batch_size=128, show_progress=True, cursor_batch_size=1000,
+                 embed_fields=('website', 'index', 'URL', 'info'), display_fields=('website', 'URL', 'info'),
+                 search_mode='dense', hybrid_nprobe=None, rrf_k=60, lexical_limit=None, bm25_folder='output/bm25',
                  chunk_size=1024, chunk_overlap=256, add_start_index=True,
                  model_name='Qwen/multilingual-e5-large-instruct', snapshot_folder='output/snapshot', 
                  device='cpu', max_length=512, normalize_embeddings=False):
@@ -27,6 +33,17 @@ class VDB:
         self.page_limit = page_limit
         self.batch_size = batch_size
         self.show_progress = show_progress
+        self.cursor_batch_size = cursor_batch_size
+        # Only these fields are read from MongoDB for embedding and for displaying hits
+        self.embed_projection = {'_id': 0, **{field: 1 for field in embed_fields}}
+        self.display_projection = {'_id': 0, 'index': 1, **{field: 1 for field in display_fields}}
+        # 'hybrid' fuses BM25 and vector candidates with reciprocal rank fusion; the lexical candidates carry
+        # recall, so the ANN stage can run with the lower `hybrid_nprobe`
+        self.search_mode = search_mode
+        self.hybrid_nprobe = hybrid_nprobe if hybrid_nprobe is not None else nprobe
+        self.rrf_k = rrf_k
+        self.lexical_limit = lexical_limit if lexical_limit is not None else 10 * limit
+        self.bm25 = BM25(os.path.join(bm25_folder, f'{collection_name}.sqlite'))
 
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
@@ -43,6 +60,7 @@ class VDB:
                                                             add_start_index=self.add_start_index)
         self.embedding_model = self.make_embedding_model()
         self.embedding_size = self.make_embedding_size()
+        self.renewed = False
         self.connect_to_milvus()
         self.collection = self.make_collection()
         self.load()
@@ -52,18 +70,23 @@ class VDB:
         embeddings = self.embedding_model.embed_documents(texts)
         if embeddings is not None:
             self.insert(indices, embeddings)
+            self.bm25.add(indices, texts)
         return
 
     def update(self, database):
         collection = database.collection
         total_records = collection.count_documents({})
-        cursor = collection.find()
+        projection = {**self.embed_projection, 'content_hash': 1}
+        cursor = database.scan(projection=projection, batch_size=self.cursor_batch_size)
+        self.bm25.reset()
 
         buffer_texts = []
         buffer_indices = []
+        buffer_records = []
 
         with tqdm(total=total_records, disable=not self.show_progress, desc="Updating Milvus") as pbar:
             for record in cursor:
+                buffer_records.append((record['index'], record.get('content_hash')))
                 document = self.record_to_document(record)
                 splitted_documents = self.text_splitter.split_documents([document])
                 for i, splitted_document in enumerate(splitted_documents):
@@ -75,21 +98,143 @@ class VDB:
 
                 if len(buffer_texts) >= self.batch_size:
                     self._embed_and_insert(buffer_texts, buffer_indices)
+                    self.mark_embedded(collection, buffer_records)
                     buffer_texts.clear()
                     buffer_indices.clear()
+                    buffer_records.clear()
                 pbar.update(1)
 
-            if buffer_texts:
-                self._embed_and_insert(buffer_texts, buffer_indices)
+            if buffer_records:
+                if buffer_texts:
+                    self._embed_and_insert(buffer_texts, buffer_indices)
+                self.mark_embedded(collection, buffer_records)
+
+        self.flush()
+        return
+
+    def sync(self, database, prune=True):
+        """
+        Embed only the records that are new or changed since they were last embedded, i.e. without `embedded_at` or
+        whose `content_hash` differs from `embedded_hash`. Their old chunk vectors are deleted before the new ones are
+        inserted, and with `prune` the vectors of records removed from MongoDB are deleted as well.
+        """
+        collection = database.collection
+        if not self.renewed and len(self.bm25) == 0:
+            self.build_lexical(database)
+        if self.renewed:
+            query = {}
+        else:
+            # Records written before content_hash existed have none and are stamped with a null embedded_hash,
+            # while a missing field is not equal to null in an expression
+            query = {'$or': [{'embedded_at': {'$exists': False}},
+                             {'$expr': {'$ne': [{'$ifNull': ['$content_hash', None]},
+                                                {'$ifNull': ['$embedded_hash', None]}]}}]}
+        total_records = collection.count_documents(query)
+        projection = {**self.embed_projection, 'content_hash': 1}
+        cursor = database.scan(query, projection=projection, batch_size=self.cursor_batch_size)
+
+        buffer_texts = []
+        buffer_indices = []
+        buffer_records = []
+
+        with tqdm(total=total_records, disable=not self.show_progress, desc="Syncing Milvus") as pbar:
+            for record in cursor:
+                buffer_records.append((record['index'], record.get('content_hash')))
+                document = self.record_to_document(record)
+                splitted_documents = self.text_splitter.split_documents([document])
+                for i, splitted_document in enumerate(splitted_documents):
+                    splitted_index = f"{splitted_document.metadata['index']}_{i}"
+                    buffer_texts.append(splitted_document.page_content)
+                    buffer_indices.append(splitted_index)
+
+                if len(buffer_texts) >= self.batch_size:
+                    self._sync_batch(collection, buffer_texts, buffer_indices, buffer_records)
+                    buffer_texts.clear()
+                    buffer_indices.clear()
+                    buffer_records.clear()
+                pbar.update(1)
+
+            if buffer_records:
+                self._sync_batch(collection, buffer_texts, buffer_indices, buffer_records)
 
+        if prune and not self.renewed:
+            self.prune(database)
         self.flush()
+        self.renewed = False
+        return
+
+    def build_lexical(self, database):
+        """
+        Index the chunks of the already embedded records in BM25, e.g. for vectors embedded before it existed.
+        """
+        query = {'embedded_at': {'$exists': True}}
+        total_records = database.collection.count_documents(query)
+        cursor = database.scan(query, projection=self.embed_projection, batch_size=self.cursor_batch_size)
+        for record in tqdm(cursor, total=total_records, disable=not self.show_progress, desc="Indexing BM25"):
+            document = self.record_to_document(record)
+            splitted_documents = self.text_splitter.split_documents([document])
+            self.bm25.add([f"{record['index']}_{i}" for i in range(len(splitted_documents))],
+                          [splitted_document.page_content for splitted_document in splitted_documents])
+        self.bm25.save()
+        return
+
+    def _sync_batch(self, collection, texts, indices, records):
+        # A record is never split across batches, so all of its chunks are replaced at once
+        if not self.renewed:
+            self.delete_records([index for index, _ in records])
+        if texts:
+            self._embed_and_insert(texts, indices)
+        self.mark_embedded(collection, records)
+        return
+
+    def mark_embedded(self, collection, records):
+        # Stamped with the content_hash read by the scan, so that a record changed meanwhile is embedded again, and
+        # only once its chunks are in BM25 on disk
+        self.bm25.save()
+        now = datetime.now(timezone.utc)
+        operations = [UpdateOne({'index': index}, {'$set': {'embedded_at': now, 'embedded_hash': content_hash}})
+                      for index, content_hash in records]
+        collection.bulk_write(operations, ordered=False)
+        return
+
+    def prune(self, database):
+        """
+        Delete the vectors of records that no longer exist in MongoDB.
+        """
+        stored = set(record['index'] for record in database.scan(projection={'_id': 0, 'index': 1},
+                                                                 batch_size=self.cursor_batch_size))
+        iterator = self.collection.query_iterator(batch_size=self.cursor_batch_size, expr='index != ""',
+                                                  output_fields=['index'])
+        removed = set()
+        while True:
+            batch = iterator.next()
+            if not batch:
+                iterator.close()
+                break
+            removed.update(self.make_mongodb_index(hit['index']) for hit in batch
+                           if self.make_mongodb_index(hit['index']) not in stored)
+        removed = list(removed)
+        for i in range(0, len(removed), self.batch_size):
+            self.delete_records(removed[i:i + self.batch_size])
+        if removed:
+            print(f'Deleted the vectors of {len(removed)} removed records')
+        return
+
+    def delete_records(self, indices):
+        # Chunk vectors are keyed <record index>_<chunk number>
+        if indices:
+            self.collection.delete(' or '.join(f'index like "{index}_%"' for index in indices))
+            self.bm25.remove_records(indices)
         return
 
-    def search(self, database, queries):
+    def search(self, database, queries, mode=None):
+        mode = self.search_mode if mode is None else mode
+        if mode not in ['dense', 'hybrid']:
+            raise ValueError('Not valid search mode')
         embeddings = self.make_embedding_from_queries(queries)
         search_params = {
             "metric_type": self.metric_type,
-            "params": {"nprobe": self.nprobe}
+            "params": {"nprobe": self.nprobe if mode == 'dense' else self.hybrid_nprobe}
         }
         milvus_result = self.collection.search(
             data=embeddings,  # The query vector(s)
@@ -99,7 +244,7 @@ class VDB:
             output_fields=["index"]  # Fields to return in the result (like IDs or other metadata)
         )
         result = []
-        for milvus_result_i in milvus_result:
+        for query, milvus_result_i in zip(queries, milvus_result):
             result_i = {}
             for hit in milvus_result_i:
                 mongodb_index = self.make_mongodb_index(hit.id)
@@ -110,8 +255,10 @@ class VDB:
                     result_i[mongodb_index] = {'distance': hit.distance}
             result_i = OrderedDict(sorted(result_i.items(), key=lambda item: item[1]['distance'],
                                           reverse=self.similarity_order == 'greater'))
+            if mode == 'hybrid':
+                result_i = self.fuse(result_i, self.lexical_search(query))
             indices_i = list(result_i.keys())
-            mongodb_result_i = database.collection.find({"index": {"$in": indices_i}})
+            mongodb_result_i = database.collection.find({"index": {"$in": indices_i}}, self.display_projection)
 
             for j, record in enumerate(mongodb_result_i):
                 index_key = record['index']
@@ -121,9 +268,31 @@ class VDB:
             result.append(result_i)
         return result
 
+    def lexical_search(self, query):
+        # Records ranked by their best matching chunk
+        result = OrderedDict()
+        for index, score in self.bm25.search(query, limit=self.lexical_limit):
+            mongodb_index = self.make_mongodb_index(index)
+            if mongodb_index not in result:
+                result[mongodb_index] = {'bm25': score}
+        return result
+
+    def fuse(self, dense_result, lexical_result):
+        """
+        Reciprocal rank fusion of the dense and lexical rankings, keeping the `limit` best records.
+        """
+        scores = {}
+        for ranking in [dense_result, lexical_result]:
+            for rank, index in enumerate(ranking):
+                scores[index] = scores.get(index, 0) + 1 / (self.rrf_k + rank + 1)
+        indices = sorted(scores, key=lambda index: scores[index], reverse=True)[:self.limit]
+        result = OrderedDict()
+        for index in indices:
+            result[index] = {'distance': dense_result.get(index, {}).get('distance'), 'score': scores[index]}
+        return result
+
     def make_documents(self, database):
-        collection = database.collection
-        records = collection.find()
+        records = database.scan(projection=self.embed_projection, batch_size=self.cursor_batch_size)
         documents = []
         indices = []
         for record in records:
@@ -138,9 +307,11 @@ class VDB:
 
     def record_to_document(self, record):
         metadata_keys = ['_id', 'index', 'URL']  # Define the fields that should be metadata
+        bookkeeping_keys = ['content_hash', 'crawled_at', 'updated_at', 'embedded_at', 'embedded_hash']  # Not embedded
         metadata = {key: str(record[key]) for key in metadata_keys if key in record}
         # Combine the remaining key-value pairs into a single string for page content
-        page_content = "\n".join([f"{key}: {value}" for key, value in record.items() if key not in metadata_keys])
+        page_content = "\n".join([f"{key}: {value}" for key, value in record.items()
+                                  if key not in metadata_keys and key not in bookkeeping_keys])
         document = Document(page_content=page_content, metadata=metadata)
         return document
 
@@ -199,6 +370,8 @@ class VDB:
             if self.renew:
                 collection.drop()
                 collection = self.make_collection()
+                self.renewed = True
+                self.bm25.reset()
         else:
             index_field = FieldSchema(name="index", dtype=DataType.VARCHAR, max_length=128, is_primary=True,
                                       auto_id=False)
@@ -231,6 +404,7 @@ class VDB:
 
     def flush(self):
         self.collection.flush()
+        self.bm25.save()
         return
 
     def drop(self):
@@ -13,7 +13,11 @@ def filter_result(result):
     for index in result:
         # Ensure each record is treated as a dictionary and filter out unwanted keys
         filtered_record = {key: value for key, value in result[index]['record'].items() if key not in filtered_keys}
-        filtered_record['distance'] = result[index]['distance']
+        # Hybrid search ranks by the fused score, and records found only by BM25 have no distance
+        if result[index].get('distance') is not None:
+            filtered_record['distance'] = result[index]['distance']
+        if result[index].get('score') is not None:
+            filtered_record['score'] = result[index]['score']
         filtered_results.append(filtered_record)
     return filtered_results
 
@@ -50,12 +54,12 @@ def main():
         config = yaml.safe_load(file)
 
     # Connect to MongoDB
-    database = coldata.mongodb.MongoDB(mode=mode, **config['mongodb'])
+    database = coldata.mongodb.MongoDB(mode=mode, profile='search', **config['mongodb'])
 
     # Initialize Milvus vector database (vdb)
     vdb = coldata.vdb.VDB(**config['vdb']['milvus'], **config['vdb']['text'], **config['vdb']['model'])
     if if_update:
-        vdb.update(database)
+        vdb.sync(database)
 
     # Gradio UI function
     def gradio_search_interface(search_term):
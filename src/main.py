@@ -9,37 +9,17 @@ def main():
     setup_milvus = True
     with open(config_path, 'r') as file:
         config = yaml.safe_load(file)
-    database = coldata.mongodb.MongoDB(mode=mode, **config['mongodb'])
+    # Index migration and sync are long maintenance operations, so they use the ingest profile
+    database = coldata.mongodb.MongoDB(mode=mode, profile='ingest', **config['mongodb'])
+    database.migrate_unique_index(config['mongodb']['index_field'])
 
-    uci = coldata.crawler.UCI(database, **config['crawler'])
-    uci.crawl(is_upload=True)
-
-    kaggle = coldata.crawler.Kaggle(database, **config['crawler'])
-    kaggle.crawl(is_upload=True)
-
-    aws = coldata.crawler.AWS(database, **config['crawler'])
-    aws.crawl(is_upload=True)
-
-    pwc = coldata.crawler.PapersWithCode(database, **config['crawler'])
-    pwc.crawl(is_upload=True)
-
-    opendatalab = coldata.crawler.OpenDataLab(database, **config['crawler'])
-    opendatalab.crawl(is_upload=True)
-
-    ieeedp = coldata.crawler.IEEEDataPort(database, **config['crawler'])
-    ieeedp.crawl(is_upload=True)
-
-    huggingface = coldata.crawler.HuggingFace(database, **config['crawler'])
-    huggingface.crawl(is_upload=True)
-
-    bdsp = coldata.crawler.BrainDataSciencePlatform(database, **config['crawler'])
-    bdsp.crawl(is_upload=True)
+    coldata.crawler.run_crawlers(mode, config, **config['orchestrator'])
 
     exit()
     if setup_milvus:
         vdb = coldata.vdb.VDB(**config['vdb']['milvus'], **config['vdb']['text'], **config['vdb']['model'])
         if is_update or config['vdb']['milvus']['renew']:
-            vdb.update(database)
+            vdb.sync(database)
         print(f"Number of entities in collection: {vdb.collection.num_entities}")
         result = vdb.search(database, ['Scene Parsing Benchmark'])
 
@@ -53,7 +33,7 @@ def main():
                 preview = info[:200] + '...' if len(info) > 200 else info
 
                 print(f"[{rank}] Index: {index}")
-                print(f"     Distance: {distance:.4f}")
+                print(f"     Distance: {distance:.4f}" if distance is not None else "     Distance: -")
                 print(f"     URL: {url}")
                 print(f"     Info: {preview}")
 
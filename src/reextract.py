@@ -0,0 +1,32 @@
+import argparse
+import time
+import yaml
+import coldata
+
+
+def main():
+    mode = 'local'
+    config_path = 'config.yml'
+    with open(config_path, 'r') as file:
+        config = yaml.safe_load(file)
+    parser = argparse.ArgumentParser(description='Rebuild the info of archived pages with the current parse settings')
+    parser.add_argument('--sources', nargs='*', default=config['orchestrator']['sources'])
+    parser.add_argument('--no_upload', action='store_true')
+    args = parser.parse_args()
+
+    database = coldata.mongodb.MongoDB(mode=mode, profile='ingest', **config['mongodb'])
+    summaries = []
+    for data_name in args.sources:
+        start = time.time()
+        # Only archived pages are read, so the sources skip listing their datasets
+        source = getattr(coldata.crawler, data_name)(database, listing=False, **config['crawler'])
+        source.reextract(is_upload=not args.no_upload)
+        summary = source.summary()
+        summary.update({'website': data_name, 'time': time.time() - start, 'status': 'done'})
+        summaries.append(summary)
+    coldata.crawler.print_summary(summaries)
+    return
+
+
+if __name__ == '__main__':
+    main()